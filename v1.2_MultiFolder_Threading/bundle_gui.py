@@ -3,21 +3,32 @@ from tkinter import ttk, filedialog, messagebox
 import os
 import threading
 import queue
+import multiprocessing
+
+from bundler import BundleOptions, ProgressReporter, bundle
+from bundler.batch import BatchProgress, batch_bundle, describe_batch, subfolders
+from bundler.compress import codec_for_path
+from bundler.progress import describe
+from bundler.watch import watch
 
 # ==============================================================================
-# CORE BUNDLING LOGIC (Moved into the class to access GUI elements)
+# CORE BUNDLING LOGIC (Moved into the headless `bundler` package)
 # ==============================================================================
-# This logic will now be part of the app class to easily update the GUI.
+# The GUI only collects folders and reports progress; the actual work is done
+# by bundler.bundle(), which is also available as `python -m bundler`.
 
 # ==============================================================================
 # GUI APPLICATION CLASS (Completely Overhauled)
 # ==============================================================================
 
 class ProjectBundlerApp:
+    # Progress is redrawn at most this often (ms), however many files there are.
+    FRAME_MS = 50
+
     def __init__(self, root):
         self.root = root
         self.root.title("Project Bundler v1.2")
-        self.root.geometry("600x450")
+        self.root.geometry("600x480")
         self.root.minsize(500, 350)
 
         # --- Main Frame ---
@@ -43,6 +54,9 @@ class ProjectBundlerApp:
         
         self.add_button = ttk.Button(button_frame, text="Add Folder...", command=self.add_folder)
         self.add_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(0, 5))
+
+        self.add_subfolders_button = ttk.Button(button_frame, text="Add Subfolders...", command=self.add_subfolders)
+        self.add_subfolders_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
         
         self.remove_button = ttk.Button(button_frame, text="Remove Selected", command=self.remove_folder)
         self.remove_button.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(5, 0))
@@ -51,6 +65,18 @@ class ProjectBundlerApp:
         action_frame = ttk.Frame(main_frame)
         action_frame.pack(fill=tk.X, pady=10)
 
+        self.dedupe_var = tk.BooleanVar(value=False)
+        self.dedupe_check = ttk.Checkbutton(action_frame, text="Write identical files only once", variable=self.dedupe_var)
+        self.dedupe_check.pack(anchor='w', pady=(0, 5))
+
+        self.batch_var = tk.BooleanVar(value=False)
+        self.batch_check = ttk.Checkbutton(action_frame, text="One bundle per folder (batch, in parallel)", variable=self.batch_var)
+        self.batch_check.pack(anchor='w', pady=(0, 5))
+
+        self.watch_var = tk.BooleanVar(value=False)
+        self.watch_check = ttk.Checkbutton(action_frame, text="Keep the bundle up to date (watch for changes)", variable=self.watch_var)
+        self.watch_check.pack(anchor='w', pady=(0, 5))
+
         self.bundle_button = ttk.Button(action_frame, text="Create Project Bundle...", command=self.start_bundling, state="disabled")
         self.bundle_button.pack(fill=tk.X, pady=(0, 5))
 
@@ -58,6 +84,10 @@ class ProjectBundlerApp:
         self.progress = ttk.Progressbar(action_frame, orient=tk.HORIZONTAL, length=100, mode='determinate')
         self.progress.pack(fill=tk.X, pady=(5, 0))
 
+        # --- Per-worker status (batch mode only) ---
+        self.worker_list = tk.Listbox(action_frame, height=4)
+        self.drawn_workers = None
+
         # --- Status Label ---
         self.status_label = ttk.Label(main_frame, text="Add folders to begin.", relief="sunken", anchor='w', padding=5)
         self.status_label.pack(side=tk.BOTTOM, fill=tk.X, pady=(5,0))
@@ -65,9 +95,13 @@ class ProjectBundlerApp:
         # --- Menu ---
         self.create_menu()
         
-        # Queue for thread communication
+        # Queue for thread communication (done / error); progress is polled
+        # from self.reporter while a bundle is running.
         self.queue = queue.Queue()
-        self.root.after(100, self.process_queue)
+        self.reporter = None
+        self.drawn_version = None
+        # Set to stop the watch thread, while one is running.
+        self.watch_stop = None
 
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -93,6 +127,16 @@ class ProjectBundlerApp:
                 self.folder_listbox.insert(tk.END, path)
                 self.update_ui_state()
 
+    def add_subfolders(self):
+        path = filedialog.askdirectory(title="Select a Folder Containing Projects")
+        if path:
+            existing = set(self.folder_listbox.get(0, tk.END))
+            for folder in subfolders(path):
+                folder = folder.replace(os.sep, '/')
+                if folder not in existing:
+                    self.folder_listbox.insert(tk.END, folder)
+            self.update_ui_state()
+
     def remove_folder(self):
         selected_indices = self.folder_listbox.curselection()
         # Iterate backwards to safely delete items from the list
@@ -112,48 +156,112 @@ class ProjectBundlerApp:
         """Enable or disable main controls."""
         self.bundle_button.config(state=state)
         self.add_button.config(state=state)
+        self.add_subfolders_button.config(state=state)
         self.remove_button.config(state=state)
+        self.dedupe_check.config(state=state)
+        self.batch_check.config(state=state)
+        self.watch_check.config(state=state)
         # Disable listbox interaction during bundling
         listbox_state = "normal" if state == "normal" else "disabled"
         self.folder_listbox.config(state=listbox_state)
 
+    def draw_progress(self):
+        """Show the reporter's latest state; skipped if nothing changed since the last frame."""
+        snap = self.reporter.snapshot()
+        if snap.version == self.drawn_version:
+            return
+        self.drawn_version = snap.version
+        if isinstance(self.reporter, BatchProgress):
+            self.progress['maximum'] = max(snap.total, 1)
+            self.progress['value'] = snap.done
+            self.status_label.config(text=describe_batch(snap))
+            lines = [f"Worker {i}: {text}" for i, (_, text) in enumerate(snap.workers, 1)]
+            if lines != self.drawn_workers:
+                self.drawn_workers = lines
+                self.worker_list.delete(0, tk.END)
+                for line in lines:
+                    self.worker_list.insert(tk.END, line)
+            return
+        if snap.total_bytes:
+            self.progress['maximum'] = snap.total_bytes
+            self.progress['value'] = snap.bytes
+        else:
+            self.progress['maximum'] = max(snap.total_files, 1)
+            self.progress['value'] = snap.files
+        self.status_label.config(text=describe(snap))
+
     def process_queue(self):
-        """Process messages from the worker thread."""
+        """Redraw progress once per frame and handle messages from the worker thread."""
+        if self.reporter is None:
+            return  # Idle: nothing is scheduled until the next bundle starts.
+        self.draw_progress()
         try:
             while True:
                 msg = self.queue.get_nowait()
                 msg_type = msg.get("type")
-                if msg_type == "progress":
-                    self.progress['value'] = msg["value"]
-                    self.status_label.config(text=msg.get("text", ""))
-                elif msg_type == "max_progress":
-                    self.progress['maximum'] = msg["value"]
-                elif msg_type == "reset_progress":
-                    self.progress['value'] = 0
-                    self.status_label.config(text="Starting bundle...")
-                elif msg_type == "done":
+                if msg_type == "done":
+                    self.reporter = None
                     self.set_controls_state("normal")
                     messagebox.showinfo("Success", f"Project successfully bundled!\n\nSaved to:\n{msg['path']}")
                     self.status_label.config(text="Done. Add or remove folders to bundle again.")
+                elif msg_type == "watch_update":
+                    update = msg['update']
+                    if update.changed is None:
+                        done = f"Bundled {update.files:,} files"
+                    else:
+                        done = f"Updated for {update.changed:,} changed file(s)"
+                    self.status_label.config(text=f"{done} in {update.elapsed:.1f} s. Watching for changes...")
+                elif msg_type == "watch_stopped":
+                    self.reporter = self.watch_stop = None
+                    self.bundle_button.config(text="Create Project Bundle...", command=self.start_bundling)
+                    self.set_controls_state("normal")
+                    self.status_label.config(text=f"Stopped watching. Last bundle saved to {msg['path']}")
+                elif msg_type == "batch_done":
+                    self.reporter = None
+                    self.worker_list.pack_forget()
+                    self.set_controls_state("normal")
+                    self.show_batch_summary(msg['results'], msg['output_dir'])
                 elif msg_type == "error":
+                    self.reporter = self.watch_stop = None
+                    self.worker_list.pack_forget()
+                    self.bundle_button.config(text="Create Project Bundle...", command=self.start_bundling)
                     self.set_controls_state("normal")
                     messagebox.showerror("Error", f"An error occurred during bundling:\n\n{msg['error']}")
                     self.status_label.config(text="An error occurred.")
         except queue.Empty:
             pass  # No more messages.
-        finally:
-            self.root.after(100, self.process_queue) # Check again after 100ms
+        if self.reporter is not None:
+            self.root.after(self.FRAME_MS, self.process_queue)
+
+    def show_batch_summary(self, results, output_dir):
+        failed = [r for r in results if not r.ok]
+        summary = f"{len(results) - len(failed)} of {len(results)} projects bundled into:\n{output_dir}"
+        self.status_label.config(text=summary.replace("\n", " "))
+        if not failed:
+            messagebox.showinfo("Success", summary)
+            return
+        details = "\n".join(f"{os.path.basename(r.project_dir)}: {r.error}" for r in failed[:10])
+        if len(failed) > 10:
+            details += f"\n... and {len(failed) - 10} more"
+        messagebox.showwarning("Finished with errors", f"{summary}\n\nFailed:\n{details}")
 
     def start_bundling(self):
         folders_to_bundle = self.folder_listbox.get(0, tk.END)
         if not folders_to_bundle:
             messagebox.showerror("Error", "No folders selected. Please add a folder first.")
             return
+        if self.batch_var.get():
+            self.start_batch(folders_to_bundle)
+            return
 
         default_filename = f"{os.path.basename(folders_to_bundle[0])}_bundle.txt"
         save_path = filedialog.asksaveasfilename(
             title="Save Bundle As", initialfile=default_filename,
-            defaultextension=".txt", filetypes=[("Text Files", "*.txt"), ("All Files", "*.*")]
+            defaultextension=".txt",
+            filetypes=[
+                ("Text Files", "*.txt"), ("Gzip-compressed Text", "*.txt.gz"),
+                ("XZ-compressed Text", "*.txt.xz"), ("All Files", "*.*"),
+            ]
         )
 
         if not save_path:
@@ -161,108 +269,93 @@ class ProjectBundlerApp:
             return
 
         self.set_controls_state("disabled")
-        self.queue.put({"type": "reset_progress"})
+        self.progress['value'] = 0
+        self.status_label.config(text="Starting bundle...")
+        self.reporter = ProgressReporter()
+        self.drawn_version = None
 
         # Run bundling in a separate thread
+        if self.watch_var.get():
+            # The bundle button stops the watch; everything else stays disabled.
+            self.watch_stop = threading.Event()
+            self.bundle_button.config(text="Stop Watching", command=self.stop_watching, state="normal")
+            thread = threading.Thread(
+                target=self.watch_threaded,
+                args=(folders_to_bundle, save_path, self.reporter, self.watch_stop, self.dedupe_var.get()),
+                daemon=True
+            )
+        else:
+            thread = threading.Thread(
+                target=self.bundle_project_threaded,
+                args=(folders_to_bundle, save_path, self.reporter, self.dedupe_var.get()),
+                daemon=True
+            )
+        thread.start()
+        self.root.after(self.FRAME_MS, self.process_queue)
+
+    def stop_watching(self):
+        self.bundle_button.config(state="disabled")
+        self.status_label.config(text="Stopping...")
+        self.watch_stop.set()
+        
+    def start_batch(self, folders_to_bundle):
+        output_dir = filedialog.askdirectory(title="Select a Folder for the Bundles")
+        if not output_dir:
+            self.status_label.config(text="Save operation cancelled.")
+            return
+
+        self.set_controls_state("disabled")
+        self.progress['value'] = 0
+        self.status_label.config(text=f"Starting batch of {len(folders_to_bundle)} projects...")
+        self.reporter = BatchProgress()
+        self.drawn_version = self.drawn_workers = None
+        self.worker_list.delete(0, tk.END)
+        self.worker_list.pack(fill=tk.X, pady=(5, 0))
+
         thread = threading.Thread(
-            target=self.bundle_project_threaded,
-            args=(folders_to_bundle, save_path),
+            target=self.batch_bundle_threaded,
+            args=(folders_to_bundle, output_dir, self.reporter, self.dedupe_var.get()),
             daemon=True
         )
         thread.start()
-        
-    def bundle_project_threaded(self, project_dirs, output_file_path):
-        """This function runs in a separate thread."""
+        self.root.after(self.FRAME_MS, self.process_queue)
+
+    def batch_bundle_threaded(self, project_dirs, output_dir, reporter, dedupe=False):
+        """Runs in a separate thread; the projects themselves are bundled in worker processes."""
         try:
-            all_files_to_bundle = []
-            
-            # --- First pass: Collect all file paths to calculate total for progress bar ---
-            self.queue.put({"type": "progress", "value": 0, "text": "Scanning files..."})
-            for project_dir in project_dirs:
-                ignore_list = {'.git', '.vscode', 'node_modules', 'dist', 'build', '__pycache__', '.DS_Store', '*.log', '*.pyc', os.path.basename(output_file_path)}
-                for root, dirs, files in os.walk(project_dir, topdown=True):
-                    dirs[:] = [d for d in dirs if d not in ignore_list]
-                    for file in files:
-                        if file not in ignore_list:
-                            full_path = os.path.join(root, file)
-                            all_files_to_bundle.append((project_dir, full_path))
-            
-            self.queue.put({"type": "max_progress", "value": len(all_files_to_bundle)})
-
-            # --- Second pass: Write to the output file ---
-            with open(output_file_path, 'w', encoding='utf-8') as f:
-                # Bundle Header
-                f.write("=" * 15 + " PROJECT BUNDLE " + "=" * 15 + "\n")
-                f.write(f"Bundled {len(project_dirs)} project(s).\n\n")
-
-                processed_count = 0
-                for project_dir in project_dirs:
-                    project_name = os.path.basename(project_dir)
-                    f.write(f"PROJECT BUNDLE: {project_name}\n" + "=" * 40 + "\n\n")
-                    
-                    # Filter files for the current project
-                    project_files = [path for proj, path in all_files_to_bundle if proj == project_dir]
-                    
-                    # Generate File Structure
-                    relative_paths = [os.path.relpath(p, project_dir) for p in project_files]
-                    relative_paths.sort()
-                    
-                    tree_structure = self.build_file_tree(relative_paths)
-                    tree_lines = self.generate_tree_lines(tree_structure)
-                    
-                    f.write("File Structure:\n" + "-" * 20 + "\n" + f"{project_name}/\n")
-                    for line in tree_lines: f.write(line + "\n")
-                    
-                    # Write File Contents
-                    f.write("\n\n" + "File Contents:\n" + "-" * 20 + "\n\n")
-                    for rel_path in relative_paths:
-                        full_path = os.path.join(project_dir, rel_path)
-                        display_path = rel_path.replace(os.sep, '/')
-                        
-                        # Update progress
-                        processed_count += 1
-                        status_text = f"Bundling: {display_path}"
-                        self.queue.put({"type": "progress", "value": processed_count, "text": status_text})
-                        
-                        f.write(f"--- File: {display_path} ---\n\n")
-                        try:
-                            with open(full_path, 'r', encoding='utf-8', errors='ignore') as content_file:
-                                f.write(content_file.read())
-                        except Exception as e:
-                            f.write(f"*** ERROR: Could not read file. Reason: {e} ***")
-                        f.write("\n\n" + "=" * 40 + "\n\n")
+            results = batch_bundle(project_dirs, output_dir, BundleOptions(dedupe=dedupe), progress=reporter)
+            self.queue.put({"type": "batch_done", "results": results, "output_dir": output_dir})
+        except Exception as e:
+            self.queue.put({"type": "error", "error": str(e)})
 
-            self.queue.put({"type": "done", "path": output_file_path})
+    def watch_threaded(self, project_dirs, output_file_path, reporter, stop, dedupe=False):
+        """Runs in a separate thread until stop is set, rebuilding the bundle after every change."""
+        try:
+            options = BundleOptions(compression=codec_for_path(output_file_path), dedupe=dedupe)
+            watch(
+                project_dirs, output_file_path, options, progress=reporter, stop=stop,
+                on_update=lambda update: self.queue.put({"type": "watch_update", "update": update}),
+            )
+            self.queue.put({"type": "watch_stopped", "path": output_file_path})
+        except Exception as e:
+            self.queue.put({"type": "error", "error": str(e)})
 
+    def bundle_project_threaded(self, project_dirs, output_file_path, reporter, dedupe=False):
+        """This function runs in a separate thread."""
+        try:
+            options = BundleOptions(compression=codec_for_path(output_file_path), dedupe=dedupe)
+            bundle(project_dirs, output_file_path, options, progress=reporter)
+            self.queue.put({"type": "done", "path": output_file_path})
         except Exception as e:
             self.queue.put({"type": "error", "error": str(e)})
 
-    # --- Tree generation helper functions (unchanged) ---
-    def build_file_tree(self, file_paths):
-        tree = {}
-        for path in file_paths:
-            parts = path.split(os.sep)
-            current_level = tree
-            for part in parts:
-                if part not in current_level:
-                    current_level[part] = {}
-                current_level = current_level[part]
-        return tree
-
-    def generate_tree_lines(self, tree_dict, prefix=""):
-        lines = []
-        items = sorted(tree_dict.keys(), key=lambda k: (not bool(tree_dict[k]), k.lower()))
-        for i, name in enumerate(items):
-            is_last = i == (len(items) - 1)
-            connector = "└── " if is_last else "├── "
-            lines.append(f"{prefix}{connector}{name}")
-            if tree_dict[name]:
-                new_prefix = prefix + ("    " if is_last else "│   ")
-                lines.extend(self.generate_tree_lines(tree_dict[name], new_prefix))
-        return lines
-
-# --- Main execution block (No changes here) ---
+# --- Main execution block ---
 if __name__ == "__main__":
+    # "One bundle per folder" runs its projects in worker processes. On Windows
+    # these are spawned by starting the program again, and in a frozen build
+    # (the PyInstaller .exe) that program is this GUI: freeze_support() hands
+    # such a worker to its task instead of opening another window.
+    multiprocessing.freeze_support()
     app_root = tk.Tk()
     app = ProjectBundlerApp(app_root)
     app_root.mainloop()
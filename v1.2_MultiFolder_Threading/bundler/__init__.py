@@ -0,0 +1,30 @@
+"""Headless Project Bundler engine, shared by the GUI and the command line."""
+
+from .batch import BatchProgress, batch_bundle
+from .engine import (
+    DEFAULT_IGNORE,
+    BundleOptions,
+    bundle,
+    render_bundle,
+)
+from .gitobjects import GitError
+from .index import BundleIndex
+from .progress import ProgressReporter, ProgressSnapshot
+from .sniff import ContentPolicy
+from .tree import build_file_tree, generate_tree_lines
+
+__all__ = [
+    'BatchProgress',
+    'DEFAULT_IGNORE',
+    'BundleIndex',
+    'BundleOptions',
+    'ContentPolicy',
+    'GitError',
+    'ProgressReporter',
+    'ProgressSnapshot',
+    'batch_bundle',
+    'bundle',
+    'render_bundle',
+    'build_file_tree',
+    'generate_tree_lines',
+]
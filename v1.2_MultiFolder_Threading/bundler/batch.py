@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import replace
+
+from .compress import SUFFIXES
+from .engine import BundleOptions, bundle
+from .progress import ProgressReporter
+
+# ==============================================================================
+# BATCH MODE
+# ==============================================================================
+# Bundles each project into its own file, several projects at a time on a
+# process pool, so large batches use every core rather than one GIL-bound
+# thread. Workers report their progress through a managed queue; the parent
+# folds it into a BatchProgress that the GUI polls like a ProgressReporter.
+# A failing project is recorded in its BatchResult and does not stop the rest.
+
+BatchResult = namedtuple("BatchResult", "project_dir output ok error files bytes elapsed")
+
+# workers is a tuple of (worker id, status text) for the projects in flight.
+BatchSnapshot = namedtuple(
+    "BatchSnapshot", "version done failed total files bytes workers elapsed running",
+)
+
+# Worker processes are spawned rather than forked: the parent may be a GUI
+# with threads of its own, which fork does not copy safely.
+MP_CONTEXT = "spawn"
+
+
+def output_paths(project_dirs, output_dir, options=None):
+    """One output file per project, `<name>_bundle.txt`, made unique where names repeat."""
+    suffix = ".txt"
+    if options is not None and options.compression:
+        suffix += next(s for s, name in SUFFIXES.items() if name == options.compression)
+    paths, taken = [], set()
+    for project_dir in project_dirs:
+        name = os.path.basename(os.path.normpath(project_dir)) or "project"
+        candidate, n = f"{name}_bundle{suffix}", 1
+        while candidate.lower() in taken:
+            n += 1
+            candidate = f"{name}_{n}_bundle{suffix}"
+        taken.add(candidate.lower())
+        paths.append(os.path.join(output_dir, candidate))
+    return paths
+
+def subfolders(parent_dir):
+    """The immediate, non-hidden subfolders of parent_dir, sorted by name."""
+    with os.scandir(parent_dir) as it:
+        dirs = [e.path for e in it if e.is_dir() and not e.name.startswith('.')]
+    return sorted(dirs, key=lambda p: os.path.basename(p).lower())
+
+
+def _bundle_one(project_dir, output_path, options, updates):
+    """Bundle a single project. Runs in a worker process."""
+    worker = os.getpid()
+    name = os.path.basename(os.path.normpath(project_dir))
+
+    def send(msg):
+        if msg.get("type") == "progress":
+            snap = reporter.snapshot()
+            updates.put((worker, name, snap.files, snap.total_files, snap.bytes))
+
+    reporter = ProgressReporter(send, interval=0.25)
+    started = time.monotonic()
+    try:
+        if not os.path.isdir(project_dir):
+            raise NotADirectoryError(f"not a folder: {project_dir}")
+        bundle([project_dir], output_path, options, reporter)
+    except Exception as e:
+        snap = reporter.snapshot()
+        return BatchResult(project_dir, output_path, False, f"{type(e).__name__}: {e}", snap.files, snap.bytes, time.monotonic() - started)
+    finally:
+        updates.put((worker, None, 0, 0, 0))
+    snap = reporter.snapshot()
+    return BatchResult(project_dir, output_path, True, None, snap.files, snap.bytes, time.monotonic() - started)
+
+
+class BatchProgress:
+    """
+    Thread-safe progress of a batch run: projects finished and failed, and
+    what each worker process is doing right now.
+
+    callback, if given, is called with each BatchResult as projects finish.
+    """
+
+    def __init__(self, callback=None, clock=time.monotonic):
+        self.callback = callback
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._version = 0
+        self._total = self._done = self._failed = 0
+        self._files = self._bytes = 0
+        self._workers = {}  # worker id -> (project name, files, total files, bytes)
+        self._started = clock()
+        self._finished = None
+
+    def start(self, total):
+        with self._lock:
+            self._total = total
+            self._started = self.clock()
+            self._version += 1
+
+    def worker_update(self, worker, project, files, total_files, nbytes):
+        with self._lock:
+            if project is None:
+                self._workers.pop(worker, None)
+            else:
+                self._workers[worker] = (project, files, total_files, nbytes)
+            self._version += 1
+
+    def project_done(self, result):
+        with self._lock:
+            self._done += 1
+            self._failed += not result.ok
+            self._files += result.files
+            self._bytes += result.bytes
+            self._version += 1
+        if self.callback:
+            self.callback(result)
+
+    def finish(self):
+        with self._lock:
+            self._workers.clear()
+            self._finished = self.clock()
+            self._version += 1
+
+    def snapshot(self):
+        with self._lock:
+            end = self._finished if self._finished is not None else self.clock()
+            workers = tuple(
+                (worker, f"{project}: {files:,}/{total:,} files")
+                for worker, (project, files, total, _) in sorted(self._workers.items())
+            )
+            in_flight_files = sum(w[1] for w in self._workers.values())
+            in_flight_bytes = sum(w[3] for w in self._workers.values())
+            return BatchSnapshot(
+                self._version, self._done, self._failed, self._total,
+                self._files + in_flight_files, self._bytes + in_flight_bytes,
+                workers, end - self._started, self._finished is None,
+            )
+
+
+def describe_batch(snapshot):
+    """One status line, e.g. 'Bundled 12/140 projects (1 failed), 3,400 files'."""
+    failed = f" ({snapshot.failed:,} failed)" if snapshot.failed else ""
+    return f"Bundled {snapshot.done:,}/{snapshot.total:,} projects{failed}, {snapshot.files:,} files"
+
+def _drain(updates, progress):
+    while True:
+        try:
+            progress.worker_update(*updates.get_nowait())
+        except queue.Empty:
+            return
+
+def batch_bundle(project_dirs, output_dir, options=None, workers=None, progress=None):
+    """
+    Bundle every project in project_dirs into its own file in output_dir,
+    using up to `workers` processes (default: one per CPU).
+
+    progress is a BatchProgress to poll, or a callback for each BatchResult.
+    Returns the BatchResults in the order of project_dirs.
+    """
+    options = options or BundleOptions()
+    # Per-project companion files always go next to each output.
+    options = replace(options, index_path=None, manifest_path=None)
+    if not isinstance(progress, BatchProgress):
+        progress = BatchProgress(progress)
+    project_dirs = list(project_dirs)
+    outputs = output_paths(project_dirs, output_dir, options)
+    os.makedirs(output_dir, exist_ok=True)
+    results = [None] * len(project_dirs)
+    progress.start(len(project_dirs))
+
+    context = multiprocessing.get_context(MP_CONTEXT)
+    with context.Manager() as manager:
+        updates = manager.Queue()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {
+                pool.submit(_bundle_one, project_dir, output, options, updates): i
+                for i, (project_dir, output) in enumerate(zip(project_dirs, outputs))
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                _drain(updates, progress)
+                for future in done:
+                    i = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:  # the worker process itself failed
+                        result = BatchResult(project_dirs[i], outputs[i], False, f"{type(e).__name__}: {e}", 0, 0, 0.0)
+                    results[i] = result
+                    progress.project_done(result)
+        _drain(updates, progress)
+    progress.finish()
+    return results
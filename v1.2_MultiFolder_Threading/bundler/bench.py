@@ -0,0 +1,356 @@
+import datetime
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+from .batch import MP_CONTEXT
+from .compress import SUFFIXES
+from .engine import (
+    WRITE_BUFFER_SIZE, BundleOptions, BundleWriter, FileSegment, bundle, render_bundle_header,
+    render_file, render_project_header,
+)
+from .gitobjects import GitError, GitRepository
+from .ignore import IgnoreMatcher, PathFilter
+from .reader import read_entry, read_entry_raw
+from .scanner import scan_projects
+
+# ==============================================================================
+# BENCHMARKS
+# ==============================================================================
+# Generates a reproducible synthetic project (file count, folder depth, size
+# distribution, share of binary files and of duplicates, all from one seed)
+# and times the engine on it, each measurement in a fresh process so its peak
+# RSS is its own:
+#
+#   phases   one plain, single-threaded pass with a timer around every step:
+#            walk (scan with no rules), filter (ignore rules over the walked
+#            paths), read, render and write, so their costs add up
+#   total    a real bundle() call with the given BundleOptions (read-ahead,
+#            compression, dedupe, ...), for wall time and output throughput
+#
+# Results are plain JSON, so runs from different versions can be compared
+# (see compare()). Every run after the first warm-up reads from a warm page
+# cache; the numbers measure the engine, not the disk.
+
+PHASES = ("walk", "filter", "read", "render", "write")
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal", "pareto")
+RESULTS_FORMAT = 1
+
+TEXT_EXTENSIONS = (".py", ".js", ".c", ".md", ".txt", ".json")
+# Half the binary files have a telling extension, half must be sniffed.
+BINARY_EXTENSIONS = (".png", ".dat")
+_PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+_WORDS = (
+    "def return self import value result index count item data file path name "
+    "for while if else elif class async await yield lambda None True False "
+    "buffer offset length token parse render write read open close error"
+).split()
+
+
+@dataclass(frozen=True)
+class TreeSpec:
+    """What generate_tree() builds; the same spec always gives the same files."""
+    files: int = 2000
+    depth: int = 4
+    size_dist: str = "lognormal"
+    mean_size: int = 8 * 1024
+    max_size: int = 16 * 1024 * 1024
+    binary_fraction: float = 0.05
+    duplicate_ratio: float = 0.1
+    seed: int = 0
+
+    def file_size(self, rnd):
+        mean = self.mean_size
+        if self.size_dist == "fixed":
+            size = mean
+        elif self.size_dist == "uniform":
+            size = rnd.uniform(0, 2 * mean)
+        elif self.size_dist == "lognormal":
+            sigma = 1.5
+            size = rnd.lognormvariate(math.log(max(mean, 1)) - sigma * sigma / 2, sigma)
+        elif self.size_dist == "pareto":
+            alpha = 1.2
+            size = rnd.paretovariate(alpha) * mean * (alpha - 1) / alpha
+        else:
+            raise ValueError(f"size distribution must be one of {', '.join(SIZE_DISTRIBUTIONS)}")
+        return min(int(size), self.max_size)
+
+
+def _corpus(rnd, size=256 * 1024):
+    """ASCII text resembling source code, cut into files at random offsets."""
+    lines = []
+    total = 0
+    while total < size:
+        line = "    " * rnd.randrange(4) + " ".join(rnd.choice(_WORDS) for _ in range(rnd.randint(2, 12))) + "\n"
+        lines.append(line)
+        total += len(line)
+    return "".join(lines).encode('ascii')
+
+def _text(corpus, rnd, header, size):
+    data = bytearray(header[:size])
+    start = rnd.randrange(len(corpus))
+    while len(data) < size:
+        data += corpus[start:start + size - len(data)]
+        start = 0
+    return bytes(data)
+
+def generate_tree(root, spec=TreeSpec()):
+    """
+    Build spec's synthetic project in root/project, unless root already holds
+    one built from the same spec. Returns (project folder, tree statistics).
+    """
+    project = os.path.join(root, "project")
+    spec_path = os.path.join(root, "spec.json")
+    try:
+        with open(spec_path, encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved["spec"] == asdict(spec):
+            return project, saved["stats"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    rnd = random.Random(spec.seed)
+    corpus = _corpus(rnd)
+    # Enough folders per level for about eight files per deepest folder.
+    fanout = max(2, math.ceil((spec.files / 8) ** (1 / spec.depth))) if spec.depth else 1
+    stats = {"files": 0, "bytes": 0, "binary_files": 0, "duplicates": 0}
+    folders = set()
+    samples = {False: [], True: []}  # earlier contents to copy duplicates from
+    os.makedirs(project, exist_ok=True)
+    for number in range(spec.files):
+        folder = [f"dir{rnd.randrange(fanout):02d}" for _ in range(rnd.randint(0, spec.depth))]
+        binary = rnd.random() < spec.binary_fraction
+        name = f"file{number:06d}" + rnd.choice(BINARY_EXTENSIONS if binary else TEXT_EXTENSIONS)
+        rel_path = "/".join(folder + [name])
+        written = samples[binary]
+        if written and rnd.random() < spec.duplicate_ratio:
+            data = rnd.choice(written)
+            stats["duplicates"] += 1
+        else:
+            size = spec.file_size(rnd)
+            if binary:
+                data = (_PNG_MAGIC + rnd.randbytes(size))[:max(size, len(_PNG_MAGIC))]
+            else:
+                data = _text(corpus, rnd, f"# {rel_path}\n".encode('ascii'), size)
+            # Keep a bounded sample to copy duplicates from.
+            if len(written) < 256:
+                written.append(data)
+            else:
+                written[rnd.randrange(256)] = data
+        directory = os.path.join(project, *folder)
+        if folder and tuple(folder) not in folders:
+            os.makedirs(directory, exist_ok=True)
+            folders.update(tuple(folder[:depth]) for depth in range(1, len(folder) + 1))
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(data)
+        stats["files"] += 1
+        stats["bytes"] += len(data)
+        stats["binary_files"] += binary
+    stats["folders"] = len(folders)
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump({"spec": asdict(spec), "stats": stats}, f, indent=2)
+    return project, stats
+
+
+# --- Measurements (run in worker processes) ---
+
+def phase_times(project_dirs, output_path, options):
+    """Seconds spent in each of PHASES during one plain, sequential bundle pass."""
+    clock = time.perf_counter
+    times = dict.fromkeys(PHASES, 0.0)
+
+    start = clock()
+    projects = scan_projects(project_dirs, IgnoreMatcher(ignore_files=()))
+    times["walk"] = clock() - start
+
+    start = clock()
+    matcher = options.ignore_matcher()
+    for i, project in enumerate(projects):
+        ignored = PathFilter(matcher).is_ignored
+        entries = [e for e in project.entries if not ignored(e.rel_path.replace(os.sep, "/"))]
+        projects[i] = project._replace(entries=entries)
+    times["filter"] = clock() - start
+
+    read = read_entry_raw if options.passthrough else read_entry
+    with open(output_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+        writer = BundleWriter(f, options.line_ending())
+
+        def write(piece):
+            start = clock()
+            writer.write(piece)
+            times["write"] += clock() - start
+
+        write(render_bundle_header(len(project_dirs)))
+        for number, project in enumerate(projects):
+            start = clock()
+            header = "".join(render_project_header(
+                os.path.basename(project.project_dir), (e.rel_path for e in project.entries),
+                options.tree_collapse_above, options.tree_max_depth,
+            ))
+            times["render"] += clock() - start
+            write(header)
+            for entry in project.entries:
+                start = clock()
+                result = read(entry, options.content)
+                times["read"] += clock() - start
+                if result.status == 'skipped':
+                    continue
+                start = clock()
+                path = entry.rel_path.replace(os.sep, '/')
+                segment = FileSegment(entry, number, path, render_file(path, result.content), None, None, True)
+                times["render"] += clock() - start
+                write(segment)
+        start = clock()
+        writer.close()
+        f.flush()
+        times["write"] += clock() - start
+    return times
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes, or None where unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KB
+
+def _output_bytes(output):
+    paths = output if isinstance(output, list) else [output]
+    return sum(os.path.getsize(p) for p in paths)
+
+def _measure(kind, project_dirs, output_path, options):
+    started = time.perf_counter()
+    if kind == "phases":
+        result = {"phases": phase_times(project_dirs, output_path, options)}
+        written = output_path
+    else:
+        result = {}
+        written = bundle(project_dirs, output_path, options) or output_path
+    result["seconds"] = time.perf_counter() - started
+    result["output_bytes"] = _output_bytes(written)
+    result["peak_rss"] = _peak_rss()
+    return result
+
+def _in_fresh_process(*args):
+    context = multiprocessing.get_context(MP_CONTEXT)
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_measure, *args).result()
+
+
+# --- Runs and results ---
+
+def _source_commit():
+    """The commit the bundler package is checked out at, if it is in a git checkout."""
+    try:
+        oid = GitRepository.discover(os.path.dirname(os.path.abspath(__file__))).read_ref("HEAD")
+    except (GitError, OSError):
+        return None
+    return oid.hex() if oid else None
+
+def _options_json(options):
+    return json.loads(json.dumps(
+        asdict(options), default=lambda o: sorted(o) if isinstance(o, (set, frozenset)) else str(o),
+    ))
+
+def summarize(runs):
+    """Median phase times, total time and throughputs, and the highest peak RSS, over runs."""
+    summary = {phase: statistics.median(r["phases"][phase] for r in runs) for phase in PHASES}
+    summary["total"] = statistics.median(r["total"] for r in runs)
+    for key in ("throughput", "input_throughput"):
+        values = [r[key] for r in runs if r[key] is not None]
+        summary[key] = statistics.median(values) if values else None
+    peaks = [r["peak_rss"] for r in runs if r["peak_rss"] is not None]
+    summary["peak_rss"] = max(peaks) if peaks else None
+    return summary
+
+def run_benchmark(spec=TreeSpec(), options=None, repeat=3, tree_dir=None, label=None, log=None):
+    """
+    Generate (or reuse, in tree_dir) spec's tree, then measure the engine
+    `repeat` times after one warm-up run. Returns the results as a dict
+    ready for json.dump().
+    """
+    options = options or BundleOptions()
+    log = log or (lambda message: None)
+    with tempfile.TemporaryDirectory(prefix="bundler-bench-") as scratch:
+        root = tree_dir or os.path.join(scratch, "tree")
+        log(f"Generating {spec.files:,} files in {root}...")
+        started = time.perf_counter()
+        project, stats = generate_tree(root, spec)
+        log(f"Tree ready: {stats['files']:,} files, {stats['bytes']:,} bytes ({time.perf_counter() - started:.1f}s)")
+
+        output_path = os.path.join(scratch, "bundle.txt")
+        if options.compression:
+            output_path += next(s for s, name in SUFFIXES.items() if name == options.compression)
+        # The phased pass writes elsewhere, so an --incremental run keeps its previous bundle.
+        phases_path = os.path.join(scratch, "phases.txt")
+        log("Warm-up run...")
+        _in_fresh_process("total", [project], output_path, options)
+        runs = []
+        for number in range(1, repeat + 1):
+            phased = _in_fresh_process("phases", [project], phases_path, options)
+            full = _in_fresh_process("total", [project], output_path, options)
+            run = {
+                "phases": phased["phases"],
+                "phases_peak_rss": phased["peak_rss"],
+                "total": full["seconds"],
+                "output_bytes": full["output_bytes"],
+                "throughput": full["output_bytes"] / full["seconds"] if full["seconds"] else None,
+                "input_throughput": stats["bytes"] / full["seconds"] if full["seconds"] else None,
+                "peak_rss": full["peak_rss"],
+            }
+            runs.append(run)
+            log(f"Run {number}/{repeat}: {run['total']:.3f}s")
+
+    return {
+        "format": RESULTS_FORMAT,
+        "label": label,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _source_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "tree": {"spec": asdict(spec), **stats},
+        "options": _options_json(options),
+        "runs": runs,
+        "summary": summarize(runs),
+    }
+
+
+def _format_value(key, value):
+    if value is None:
+        return "-"
+    if key in ("throughput", "input_throughput"):
+        return f"{value / (1024 * 1024):.1f} MB/s"
+    if key == "peak_rss":
+        return f"{value / (1024 * 1024):.1f} MB"
+    return f"{value:.3f} s"
+
+def compare(results, baseline=None):
+    """Summary lines for results, with the change from baseline results if given."""
+    keys = PHASES + ("total", "throughput", "input_throughput", "peak_rss")
+    lines = []
+    for key in keys:
+        value = results["summary"].get(key)
+        line = f"{key:<17}{_format_value(key, value):>14}"
+        if baseline is not None:
+            old = baseline.get("summary", {}).get(key)
+            line += f"{_format_value(key, old):>14}"
+            if value is not None and old:
+                line += f"{(value - old) / old:>+9.1%}"
+        lines.append(line)
+    if baseline is not None:
+        lines.insert(0, f"{'':<17}{results.get('label') or 'this run':>14}{baseline.get('label') or 'baseline':>14}")
+    return lines
@@ -0,0 +1,298 @@
+import os
+import re
+from dataclasses import replace
+
+from .compress import SUFFIXES, CompressedStream
+from .engine import (
+    SEPARATOR, WRITE_BUFFER_SIZE, render_bundle, render_file_header, render_project_header,
+)
+from .reader import RawFile
+
+# ==============================================================================
+# CHUNKED OUTPUT
+# ==============================================================================
+# Splits a bundle into numbered chunks that each fit a size budget, measured
+# in bytes or in estimated tokens, e.g. for an LLM context window. Every chunk
+# is a small bundle of its own: a header, then for each project it touches the
+# part of the file tree it contains, then those files.
+#
+# Files are packed whole. Only a file that cannot fit even an empty chunk is
+# split, at line boundaries, into "(part i of n)" pieces. Only the chunk being
+# filled is held in memory, so memory does not grow with the size of the repo.
+
+# A rough, fast token estimate: leading whitespace joins the next token, long
+# words count one token per 8 letters, numbers one per 3 digits, and every
+# other character (punctuation, each byte of non-ASCII text) one each. It
+# tends to overestimate, which is the safe side for a context budget.
+TOKEN_PATTERN = re.compile(rb"\s*(?:[A-Za-z]{1,8}|[0-9]{1,3}|[^\sA-Za-z0-9])|\s+")
+
+CHUNK_UNITS = ("bytes", "tokens")
+
+
+def estimate_tokens(data):
+    return TOKEN_PATTERN.subn(b"", data)[1]
+
+def _split_output(output_path):
+    """(stem, extension) of output_path, a compression suffix included in the extension."""
+    stem, ext = os.path.splitext(os.fspath(output_path))
+    if ext.lower() in SUFFIXES:
+        stem, inner = os.path.splitext(stem)
+        ext = inner + ext
+    return stem, ext
+
+def chunk_path(output_path, number):
+    """'out.txt' -> 'out.001.txt'; a compression suffix stays last ('out.001.txt.gz')."""
+    stem, ext = _split_output(output_path)
+    return f"{stem}.{number:03d}{ext}"
+
+def _remove_stale_chunks(output_path, keep):
+    """Delete chunk files of output_path, left by an earlier run, that are not in keep."""
+    stem, ext = _split_output(output_path)
+    folder = os.path.dirname(stem) or "."
+    name = re.compile(re.escape(os.path.basename(stem)) + r"\.[0-9]{3,}" + re.escape(ext))
+    keep = {os.path.abspath(p) for p in keep}
+    for entry in os.scandir(folder):
+        if name.fullmatch(entry.name) and entry.is_file() and os.path.abspath(entry.path) not in keep:
+            os.unlink(entry.path)
+
+def chunk_ignore_pattern(output_path):
+    """An ignore pattern matching every chunk file of output_path."""
+    name = re.sub(r"([\\*?\[])", r"\\\1", os.path.basename(chunk_path(output_path, 0)))
+    return name.replace(".000", ".[0-9][0-9][0-9]*", 1)
+
+def render_chunk_header(number, project_count):
+    return "=" * 15 + f" PROJECT BUNDLE (PART {number}) " + "=" * 15 + "\n" + f"Bundled {project_count} project(s).\n\n"
+
+def _utf8_boundary(data, cut):
+    """Move cut back to the start of a UTF-8 character."""
+    while cut > 0 and data[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return cut
+
+
+class ChunkWriter:
+    """
+    Packs FileSegments into chunk files of at most `budget` units.
+
+    open_chunk(number) returns the binary stream chunk `number` is written to;
+    the writer closes it. collapse_above and max_depth shape each chunk's
+    file tree as in tree.iter_tree_lines.
+    """
+
+    def __init__(self, open_chunk, budget, unit, newline, project_names, collapse_above=None, max_depth=None):
+        if unit not in CHUNK_UNITS:
+            raise ValueError(f"chunk unit must be one of {', '.join(CHUNK_UNITS)}")
+        self.open_chunk = open_chunk
+        self.budget = budget
+        self.measure = len if unit == "bytes" else estimate_tokens
+        self.newline = newline
+        self.collapse_above = collapse_above
+        self.max_depth = max_depth
+        self.project_names = project_names
+        self.chunks = 0
+        self._footer = self.encode("\n\n" + SEPARATOR + "\n\n")
+        self._header_cost = self.measure(self.encode(render_chunk_header(99999, len(project_names))))
+        self._project_costs = [
+            self.measure(self.encode("".join(render_project_header(name, [], collapse_above, max_depth))))
+            for name in project_names
+        ]
+        self._reset()
+
+    def _reset(self):
+        self._files = []      # (project, rel_path, [bytes, ...]) in order
+        self._dirs = set()    # (project, rel_path) of folders already in the tree
+        self._used = self._header_cost
+
+    def encode(self, text):
+        if self.newline != "\n":
+            text = text.replace("\n", self.newline)
+        return text.encode('utf-8')
+
+    def _tree_cost(self, project, rel_path, empty=False):
+        """Cost of the tree lines (and project header) adding rel_path would bring."""
+        dirs = () if empty else self._dirs
+        cost = 0
+        if empty or not any(f[0] == project for f in self._files[-1:]):
+            cost += self._project_costs[project]
+        parts = rel_path.split(os.sep)
+        for depth, name in enumerate(parts):
+            is_folder = depth < len(parts) - 1
+            # A folder at max_depth is one summary line, with nothing below it.
+            deepest = is_folder and self.max_depth is not None and depth + 1 >= self.max_depth
+            if is_folder and (project, os.sep.join(parts[:depth + 1])) in dirs:
+                if deepest:
+                    break
+                continue
+            line = "│   " * depth + "├── " + name
+            if deepest or (is_folder and self.collapse_above is not None):
+                # Whether a folder ends up collapsed is only known once the
+                # chunk is full, so its line is charged at the longer size.
+                line += "/ … 999,999,999 files"
+            cost += self.measure(self.encode(line + "\n"))
+            if deepest:
+                break
+        return cost
+
+    def _room(self, project, rel_path):
+        return self.budget - self._used - self._tree_cost(project, rel_path)
+
+    def _empty_room(self, project, rel_path):
+        return self.budget - self._header_cost - self._tree_cost(project, rel_path, empty=True)
+
+    def _append(self, project, rel_path, parts, cost):
+        self._used += self._tree_cost(project, rel_path) + cost
+        parts_of_path = rel_path.split(os.sep)
+        for depth in range(1, len(parts_of_path)):
+            self._dirs.add((project, os.sep.join(parts_of_path[:depth])))
+        self._files.append((project, rel_path, parts))
+
+    def _encode_segment(self, segment):
+        if isinstance(segment.text, str):
+            return self.encode(segment.text)
+        header, body, footer = segment.text
+        if isinstance(body, RawFile):
+            # Chunks are measured, so the file is read after all.
+            with body.file:
+                body = body.file.read()
+        return b"".join((header, body, footer))
+
+    def write(self, segment):
+        project, rel_path = segment.project, segment.entry.rel_path
+        data = self._encode_segment(segment)
+        cost = self.measure(data)
+        if cost <= self._room(project, rel_path):
+            self._append(project, rel_path, [data], cost)
+            return
+        empty_room = self._empty_room(project, rel_path)
+        if self._files and (cost <= empty_room or self._room(project, rel_path) < empty_room // 4):
+            self.flush()
+            if cost <= empty_room:
+                self._append(project, rel_path, [data], cost)
+                return
+        self._write_split(segment, data)
+
+    def _write_split(self, segment, data):
+        """Spread one oversized file over as many chunks as it needs, cut at line breaks."""
+        project, rel_path, path = segment.project, segment.entry.rel_path, segment.path
+        header_length = len(self.encode(render_file_header(path)))
+        body = data[header_length:len(data) - len(self._footer)]
+        overhead = self.measure(self.encode(f"--- File: {path} (part 999 of 999) ---\n\n")) + self.measure(self._footer)
+        later = self._empty_room(project, rel_path) - overhead
+        if later <= 0:
+            raise ValueError(f"chunk size {self.budget:,} is too small to hold any of {path}")
+        first = self._room(project, rel_path) - overhead
+        if first <= 0:
+            self.flush()
+            first = later
+        pieces = self._split_lines(body, first, later)
+        for number, piece in enumerate(pieces, 1):
+            if number > 1:
+                self.flush()
+            header = self.encode(f"--- File: {path} (part {number} of {len(pieces)}) ---\n\n")
+            parts = [header, piece, self._footer]
+            self._append(project, rel_path, parts, sum(self.measure(p) for p in parts))
+
+    def _split_lines(self, body, first, later):
+        """Cut body into pieces of at most first, then later, units, at line breaks where possible."""
+        pieces = []
+        start = pos = used = 0
+        room = first
+        while pos < len(body):
+            end = body.find(b"\n", pos) + 1 or len(body)
+            cost = self.measure(body[pos:end])
+            if used + cost > room and pos > start:
+                pieces.append(body[start:pos])
+                start, used, room = pos, 0, later
+            while cost > room:
+                # A single line longer than a whole piece: cut it where it fills one.
+                cut = self._cut(body, start, end, room)
+                pieces.append(body[start:cut])
+                start, used, room = cut, 0, later
+                cost = self.measure(body[start:end])
+            used += cost
+            pos = end
+        if start < len(body) or not pieces:
+            pieces.append(body[start:])
+        return pieces
+
+    def _cut(self, body, start, end, room):
+        lo, hi = start, end
+        if self.measure is len:
+            lo = start + max(room, 0)
+        else:
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self.measure(body[start:mid]) <= room:
+                    lo = mid
+                else:
+                    hi = mid - 1
+        cut = _utf8_boundary(body, lo)
+        if cut <= start:
+            # Less room than one character: take one anyway.
+            cut = start + 1
+            while cut < end and body[cut] & 0xC0 == 0x80:
+                cut += 1
+        return cut
+
+    def flush(self):
+        """Write the chunk being filled, if it holds anything."""
+        if not self._files:
+            return
+        self.chunks += 1
+        out = self.open_chunk(self.chunks)
+        try:
+            out.write(self.encode(render_chunk_header(self.chunks, len(self.project_names))))
+            i = 0
+            while i < len(self._files):
+                project = self._files[i][0]
+                j = i
+                while j < len(self._files) and self._files[j][0] == project:
+                    j += 1
+                group = self._files[i:j]
+                paths = list(dict.fromkeys(f[1] for f in group))
+                for text in render_project_header(self.project_names[project], paths, self.collapse_above, self.max_depth):
+                    out.write(self.encode(text))
+                for _, _, parts in group:
+                    for part in parts:
+                        out.write(part)
+                i = j
+        finally:
+            out.close()
+        self._reset()
+
+
+def bundle_chunks(project_dirs, output_path, options, progress=None):
+    """Write the bundle as numbered chunk files and return their paths."""
+    output_path = os.fspath(output_path)
+    options = replace(options, ignore=tuple(options.ignore) + (chunk_ignore_pattern(output_path),))
+    paths = []
+
+    def open_chunk(number):
+        path = chunk_path(output_path, number)
+        paths.append(path)
+        f = open(path, 'wb', buffering=WRITE_BUFFER_SIZE)
+        if not options.compression:
+            return f
+        return _ClosingCompressedStream(f, options.compression, options.compression_level)
+
+    project_names = [os.path.basename(os.fspath(d)) for d in project_dirs]
+    writer = ChunkWriter(
+        open_chunk, options.chunk_size, options.chunk_unit, options.line_ending(), project_names,
+        options.tree_collapse_above, options.tree_max_depth,
+    )
+    for segment in render_bundle(project_dirs, options, progress, headers=False):
+        writer.write(segment)
+    writer.flush()
+    # A smaller bundle than last time leaves the old chunks past its end behind.
+    _remove_stale_chunks(output_path, paths)
+    return paths
+
+
+class _ClosingCompressedStream(CompressedStream):
+    """A CompressedStream that also closes the file it writes to."""
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.raw.close()
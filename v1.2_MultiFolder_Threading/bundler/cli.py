@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+
+from .batch import batch_bundle, subfolders
+from .bench import SIZE_DISTRIBUTIONS, TreeSpec, compare, run_benchmark
+from .compress import CODECS, codec_for_path
+from .engine import DEFAULT_IGNORE, BundleOptions, bundle
+from .gitindex import GIT_MODES
+from .gitobjects import GitError
+from .ignore import IGNORE_FILE_NAMES
+from .index import BundleIndex, BundleIndexError, extract
+from .progress import ProgressReporter, describe
+from .sniff import BINARY_POLICIES, LARGE_POLICIES, PLACEHOLDER, TRUNCATE, ContentPolicy
+from .watch import watch
+
+# ==============================================================================
+# COMMAND LINE INTERFACE
+# ==============================================================================
+# Usage:
+#   python -m bundler bundle PROJECT [PROJECT ...] [-o OUTPUT] [--index]
+#   python -m bundler bundle PROJECT [PROJECT ...] -o OUTPUT --watch
+#   python -m bundler batch PROJECT [PROJECT ...] -d OUTPUT_DIR [--workers N]
+#   python -m bundler list BUNDLE
+#   python -m bundler extract BUNDLE FILE [-o OUTPUT]
+#   python -m bundler bench [--files N] [--repeat N] [-o RESULTS.json]
+#
+# Without -o (or with -o -) the bundle is written to stdout so it can be
+# piped straight into another tool.
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m bundler", description="Bundle project folders into a single text file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("bundle", help="Bundle one or more project folders.")
+    p.add_argument("projects", nargs="+", help="Project folders to bundle.")
+    p.add_argument("-o", "--output", default="-", help="Output file (default: stdout).")
+    add_bundle_options(p)
+    p.add_argument("--progress", action="store_true", help="Report progress on stderr.")
+    p.add_argument("--watch", action="store_true", help="Keep running and update the bundle whenever the projects change (needs -o FILE; implies --incremental).")
+    p.add_argument("--poll", action="store_true", help="With --watch, poll for changes instead of using inotify.")
+    p.set_defaults(func=run_bundle)
+
+    p = commands.add_parser("batch", help="Bundle each project folder into its own file, in parallel.")
+    p.add_argument("projects", nargs="+", help="Project folders to bundle (or, with --subfolders, their parents).")
+    p.add_argument("-d", "--output-dir", required=True, help="Folder for the bundles (PROJECT_bundle.txt each).")
+    p.add_argument("--subfolders", action="store_true", help="Bundle every non-hidden subfolder of the given folders instead.")
+    p.add_argument("--workers", type=int, metavar="N", help="Processes bundling at the same time (default: one per CPU).")
+    add_bundle_options(p, batch=True)
+    p.set_defaults(func=run_batch)
+
+    p = commands.add_parser("list", help="List the files in an indexed bundle.")
+    p.add_argument("bundle", help="Bundle file written with --index.")
+    p.add_argument("--index", metavar="PATH", help="Index file (default: BUNDLE.index.json).")
+    p.set_defaults(func=run_list)
+
+    p = commands.add_parser("extract", help="Copy one file out of an indexed bundle.")
+    p.add_argument("bundle", help="Bundle file written with --index.")
+    p.add_argument("name", help="File to extract, as PROJECT/PATH or just PATH if that is unambiguous.")
+    p.add_argument("-o", "--output", default="-", help="Output file (default: stdout).")
+    p.add_argument("--index", metavar="PATH", help="Index file (default: BUNDLE.index.json).")
+    p.add_argument("--verify", action="store_true", help="Check the extracted bytes against the hash in the index.")
+    p.set_defaults(func=run_extract)
+
+    p = commands.add_parser("bench", help="Time the engine on a generated project and save the results as JSON.")
+    spec = TreeSpec()
+    p.add_argument("--files", type=int, default=spec.files, metavar="N", help=f"Files in the generated project (default: {spec.files}).")
+    p.add_argument("--depth", type=int, default=spec.depth, metavar="N", help=f"Deepest folder level (default: {spec.depth}).")
+    p.add_argument("--size-dist", choices=SIZE_DISTRIBUTIONS, default=spec.size_dist, help=f"File size distribution (default: {spec.size_dist}).")
+    p.add_argument("--mean-size", type=float, default=spec.mean_size / 1024, metavar="KB", help=f"Mean file size (default: {spec.mean_size // 1024}).")
+    p.add_argument("--max-size", type=float, default=spec.max_size / (1024 * 1024), metavar="MB", help=f"Largest file size (default: {spec.max_size // (1024 * 1024)}).")
+    p.add_argument("--binary-fraction", type=float, default=spec.binary_fraction, metavar="F", help=f"Share of binary files (default: {spec.binary_fraction}).")
+    p.add_argument("--duplicate-ratio", type=float, default=spec.duplicate_ratio, metavar="F", help=f"Share of files that copy an earlier one (default: {spec.duplicate_ratio}).")
+    p.add_argument("--seed", type=int, default=spec.seed, help="Random seed; the same options always generate the same files.")
+    p.add_argument("--tree", metavar="DIR", help="Generate the project here and reuse it on later runs with the same options (default: a temporary folder).")
+    p.add_argument("--repeat", type=int, default=3, metavar="N", help="Measured runs after the warm-up (default: 3).")
+    p.add_argument("--label", help="Name for this run in the results, e.g. a version.")
+    p.add_argument("-o", "--output", metavar="PATH", help="Save the results as JSON here (default: print them).")
+    p.add_argument("--baseline", metavar="PATH", help="Earlier results to compare with.")
+    add_bundle_options(p, batch=True)
+    p.set_defaults(func=run_bench)
+    return parser
+
+def add_bundle_options(p, batch=False):
+    """Options shared by 'bundle' and 'batch'; batch leaves out per-output paths."""
+    p.add_argument("--git", choices=GIT_MODES, help="List files from the git index instead of walking the folders: all tracked files, or only changed ones (no git binary needed).")
+    p.add_argument("--git-base", metavar="REV", help="With --git changed, compare with this commit (branch, tag, id, HEAD~N) instead of the index.")
+    p.add_argument("--ignore", action="append", default=[], metavar="PATTERN", help="Extra .gitignore-style pattern to skip (repeatable).")
+    p.add_argument("--no-default-ignores", action="store_true", help="Do not skip .git, node_modules, build, *.log, etc.")
+    p.add_argument("--no-ignore-files", action="store_true", help="Do not read .gitignore / .bundleignore files.")
+    p.add_argument("--binary", choices=BINARY_POLICIES, default=PLACEHOLDER, help="Binary files: leave a placeholder (default), skip their contents, or include them as text.")
+    p.add_argument("--max-file-size", type=float, default=10, metavar="MB", help="Files above this size are handled by --large (default: 10; 0 for no limit).")
+    p.add_argument("--large", choices=LARGE_POLICIES, default=TRUNCATE, help="Files over --max-file-size: keep head and tail (default), placeholder, skip, or include in full.")
+    p.add_argument("--keep-head", type=int, default=64, metavar="KB", help="With --large truncate, KB kept from the start of the file (default: 64).")
+    p.add_argument("--keep-tail", type=int, default=16, metavar="KB", help="With --large truncate, KB kept from the end of the file (default: 16).")
+    p.add_argument("--passthrough", action="store_true", help="Copy valid UTF-8 files byte-for-byte (zero-copy where possible); keeps their line endings and uses \\n for the bundle framing.")
+    p.add_argument("--read-workers", type=int, default=8, metavar="N", help="Threads reading files ahead of the writer (1 disables read-ahead).")
+    p.add_argument("--read-ahead", type=int, default=32, metavar="MB", help="Most file data held by the read-ahead stage, in MB (default: 32).")
+    p.add_argument("--incremental", action="store_true", help="Reuse unchanged file segments from the previous bundle (needs an output file).")
+    if not batch:
+        p.add_argument("--manifest", metavar="PATH", help="Manifest file for --incremental (default: OUTPUT.manifest.json).")
+    p.add_argument("--verify-hash", action="store_true", help="With --incremental, confirm unchanged files by content hash, not just stat data.")
+    p.add_argument("--index", action="store_true", help="Also write an index of file offsets and hashes for 'list' and 'extract'.")
+    if not batch:
+        p.add_argument("--index-path", metavar="PATH", help="Index file for --index (default: OUTPUT.index.json; required with stdout).")
+    p.add_argument("--compress", choices=("none", "gzip", "bz2", "xz", "zstd"), help="Compress the output (default: by the -o suffix, e.g. .gz, .xz; zstd needs the zstandard package).")
+    p.add_argument("--level", type=int, metavar="N", help="Compression level (default: the codec's own default).")
+    p.add_argument("--dedupe", action="store_true", help="Write files with identical content only once; later copies (in any project) become a reference to the first.")
+    p.add_argument("--tree-collapse", type=int, metavar="N", help="In the file structure tree, show folders holding more than N files as one line ('node_modules/ … 12,345 files').")
+    p.add_argument("--tree-depth", type=int, metavar="N", help="Open at most N levels of folders in the file structure tree; deeper ones are summarised.")
+    chunking = p.add_mutually_exclusive_group()
+    chunking.add_argument("--chunk-bytes", type=int, metavar="N", help="Split the output into numbered chunks of at most N bytes (OUTPUT.001.txt, ...).")
+    chunking.add_argument("--chunk-tokens", type=int, metavar="N", help="Split the output into numbered chunks of at most N estimated tokens.")
+
+def stderr_progress():
+    """A reporter that rewrites one status line on stderr a few times per second."""
+    tty = sys.stderr.isatty()
+
+    def show(msg):
+        if msg.get("type") != "progress":
+            return
+        line = describe(reporter.snapshot())
+        if tty:
+            print("\r" + line[:shutil.get_terminal_size().columns - 1].ljust(40), end="", file=sys.stderr, flush=True)
+        else:
+            print(line, file=sys.stderr)
+
+    reporter = ProgressReporter(show, interval=0.25 if tty else 2.0)
+    return reporter
+
+class UsageError(Exception):
+    """Options that cannot be combined; reported like an argparse error."""
+
+
+def options_from_args(args, output=None):
+    """Build BundleOptions from parsed 'bundle' / 'batch' arguments."""
+    to_stdout = output == "-"
+    index_path = getattr(args, "index_path", None)
+    if args.incremental and to_stdout:
+        raise UsageError("--incremental needs an output file (-o FILE)")
+    if args.index and to_stdout and not index_path:
+        raise UsageError("--index with stdout output needs --index-path")
+    chunk_size = args.chunk_bytes or args.chunk_tokens
+    if chunk_size and (to_stdout or args.incremental or args.index or index_path):
+        raise UsageError("--chunk-bytes/--chunk-tokens need -o FILE and cannot be combined with --incremental or --index")
+    compression = args.compress or (codec_for_path(output) if output and not to_stdout else None)
+    if compression == "none":
+        compression = None
+    if compression and compression not in CODECS:
+        raise UsageError(f"{compression} output needs the zstandard package")
+    if compression and args.level is not None:
+        codec = CODECS[compression]
+        if not codec.min_level <= args.level <= codec.max_level:
+            raise UsageError(f"{compression} --level must be between {codec.min_level} and {codec.max_level}")
+    if args.dedupe and args.incremental:
+        raise UsageError("--dedupe cannot be combined with --incremental")
+    if compression and args.incremental:
+        raise UsageError("--incremental cannot be combined with compressed output")
+    if args.tree_depth is not None and args.tree_depth < 1:
+        raise UsageError("--tree-depth must be at least 1")
+    if args.git_base and args.git == "tracked":
+        raise UsageError("--git-base only applies to --git changed")
+    ignore = () if args.no_default_ignores else DEFAULT_IGNORE
+    return BundleOptions(
+        ignore=ignore + tuple(args.ignore),
+        ignore_files=() if args.no_ignore_files else IGNORE_FILE_NAMES,
+        read_workers=args.read_workers,
+        read_ahead_bytes=args.read_ahead * 1024 * 1024,
+        incremental=args.incremental,
+        manifest_path=getattr(args, "manifest", None),
+        verify_hash=args.verify_hash,
+        passthrough=args.passthrough,
+        index=args.index or bool(index_path),
+        index_path=index_path,
+        compression=compression,
+        compression_level=args.level,
+        chunk_size=chunk_size,
+        chunk_unit="tokens" if args.chunk_tokens else "bytes",
+        dedupe=args.dedupe,
+        tree_collapse_above=args.tree_collapse,
+        tree_max_depth=args.tree_depth,
+        git_files="changed" if args.git_base else args.git,
+        git_base=args.git_base,
+        content=ContentPolicy(
+            binary=args.binary,
+            large=args.large,
+            max_file_bytes=int(args.max_file_size * 1024 * 1024) or None,
+            head_bytes=args.keep_head * 1024,
+            tail_bytes=args.keep_tail * 1024,
+        ),
+    )
+
+def run_bundle(args):
+    for project in args.projects:
+        if not os.path.isdir(project):
+            raise UsageError(f"not a folder: {project}")
+    if args.watch:
+        return run_watch(args)
+    if args.poll:
+        raise UsageError("--poll only applies to --watch")
+    options = options_from_args(args, args.output)
+    progress = stderr_progress() if args.progress else None
+    try:
+        bundle(args.projects, args.output, options, progress)
+    except ValueError as e:
+        raise UsageError(str(e)) from None
+    if progress and sys.stderr.isatty():
+        print(file=sys.stderr)
+    return 0
+
+def run_watch(args):
+    if args.output == "-":
+        raise UsageError("--watch needs an output file (-o FILE)")
+    options = options_from_args(args, args.output)
+
+    def report(update):
+        what = "Bundled" if update.changed is None else f"Updated ({update.changed:,} changed):"
+        print(f"{what} {args.output} ({update.files:,} files, {update.elapsed:.2f}s)", file=sys.stderr)
+        if update.changed is None:
+            print("Watching for changes; press Ctrl+C to stop.", file=sys.stderr)
+
+    try:
+        watch(args.projects, args.output, options, on_update=report, poll=args.poll)
+    except ValueError as e:
+        raise UsageError(str(e)) from None
+    return 0
+
+def run_batch(args):
+    if args.workers is not None and args.workers < 1:
+        raise UsageError("--workers must be at least 1")
+    options = options_from_args(args)
+    projects = args.projects
+    if args.subfolders:
+        projects = [d for parent in projects for d in subfolders(parent)]
+    if not projects:
+        raise UsageError("no project folders to bundle")
+
+    def report(result):
+        status = "ok    " if result.ok else "FAILED"
+        line = f"{status} {result.project_dir} -> {result.output} ({result.files:,} files, {result.elapsed:.1f}s)"
+        if not result.ok:
+            line += f"\n       {result.error}"
+        print(line, file=sys.stderr)
+
+    results = batch_bundle(projects, args.output_dir, options, args.workers, report)
+    failed = [r for r in results if not r.ok]
+    print(f"{len(results) - len(failed):,} of {len(results):,} projects bundled into {args.output_dir}", file=sys.stderr)
+    return 1 if failed else 0
+
+def run_list(args):
+    index = BundleIndex.load_for(args.bundle, args.index)
+    for entry in index.entries:
+        print(f"{entry.length:>12,}  {index.qualified_name(entry)}")
+    return 0
+
+def run_extract(args):
+    index = BundleIndex.load_for(args.bundle, args.index)
+    try:
+        entry = index.find(args.name)
+    except KeyError as e:
+        print(f"error: {e.args[0]}", file=sys.stderr)
+        return 1
+    if args.output == "-":
+        extract(args.bundle, entry, sys.stdout.buffer, verify=args.verify, compression=index.compression)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, 'wb') as out:
+            extract(args.bundle, entry, out, verify=args.verify, compression=index.compression)
+    return 0
+
+def run_bench(args):
+    if args.repeat < 1 or args.files < 0 or args.depth < 0:
+        raise UsageError("--repeat must be at least 1, --files and --depth at least 0")
+    if not 0 <= args.binary_fraction <= 1 or not 0 <= args.duplicate_ratio <= 1:
+        raise UsageError("--binary-fraction and --duplicate-ratio must be between 0 and 1")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    spec = TreeSpec(
+        files=args.files, depth=args.depth, size_dist=args.size_dist,
+        mean_size=int(args.mean_size * 1024), max_size=int(args.max_size * 1024 * 1024),
+        binary_fraction=args.binary_fraction, duplicate_ratio=args.duplicate_ratio, seed=args.seed,
+    )
+    results = run_benchmark(
+        spec, options_from_args(args), args.repeat, args.tree, args.label,
+        log=lambda message: print(message, file=sys.stderr),
+    )
+    for line in compare(results, baseline):
+        print(line, file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    return 0
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); that is not an error for us.
+        return 0
+    except UsageError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    except (OSError, BundleIndexError, GitError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,230 @@
+import bz2
+import lzma
+import os
+import queue
+import threading
+import zlib
+from collections import namedtuple
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd output needs the `zstandard` package
+    zstandard = None
+
+# ==============================================================================
+# COMPRESSED OUTPUT
+# ==============================================================================
+# CompressedStream is a binary file object that the BundleWriter writes to
+# like any other. Data is handed in large chunks to a compressor thread (the
+# stdlib codecs release the GIL), so compression overlaps with reading.
+#
+# The output is a series of independent frames, each a complete gzip member /
+# bz2 / xz / zstd stream; the standard tools decompress the concatenation as
+# one file. The bundle header and the first project's tree end a frame of their
+# own, so they can be read back without touching the rest, and a frame table
+# lets the index (see index.py) find the frame any offset falls in.
+
+Codec = namedtuple("Codec", "default_level min_level max_level compressor decompressor")
+
+# Output suffixes that select a codec, including codecs that may be unavailable.
+SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+CODECS = {
+    "gzip": Codec(
+        6, 1, 9,
+        lambda level: zlib.compressobj(level, zlib.DEFLATED, 31),
+        lambda: zlib.decompressobj(31),
+    ),
+    "bz2": Codec(9, 1, 9, bz2.BZ2Compressor, bz2.BZ2Decompressor),
+    "xz": Codec(
+        6, 0, 9,
+        lambda level: lzma.LZMACompressor(lzma.FORMAT_XZ, preset=level),
+        lambda: lzma.LZMADecompressor(lzma.FORMAT_XZ),
+    ),
+}
+if zstandard is not None:
+    CODECS["zstd"] = Codec(
+        3, 1, 22,
+        lambda level: zstandard.ZstdCompressor(level=level).compressobj(),
+        lambda: zstandard.ZstdDecompressor().decompressobj(),
+    )
+
+# Uncompressed bytes per frame. Larger frames compress slightly better;
+# smaller ones make random access cheaper.
+FRAME_BYTES = 4 * 1024 * 1024
+# Uncompressed bytes handed to the compressor thread at a time, and how many
+# such chunks may wait for it.
+CHUNK_BYTES = 1024 * 1024
+QUEUE_CHUNKS = 8
+
+_END_FRAME = object()
+_CLOSE = object()
+
+
+def codec_for_path(path):
+    """The codec implied by path's suffix (e.g. 'bundle.txt.gz' -> 'gzip'), or None."""
+    return SUFFIXES.get(os.path.splitext(os.fspath(path))[1].lower())
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        if name == "zstd":
+            raise ValueError("zstd output needs the 'zstandard' package") from None
+        raise ValueError(f"unknown compression {name!r}; choose from {', '.join(CODECS)}") from None
+
+
+class CompressedStream:
+    """
+    Write-only binary stream that compresses into `raw` on a background thread.
+
+    frames lists (uncompressed offset, compressed offset) of every frame
+    start; it is complete once close() has returned.
+    """
+
+    def __init__(self, raw, codec="gzip", level=None, frame_bytes=FRAME_BYTES):
+        self.raw = raw
+        self.codec_name = codec
+        self.codec = get_codec(codec)
+        self.level = self.codec.default_level if level is None else level
+        if not self.codec.min_level <= self.level <= self.codec.max_level:
+            raise ValueError(f"{codec} level must be between {self.codec.min_level} and {self.codec.max_level}")
+        self.frame_bytes = frame_bytes
+        self.frames = []
+        self.compressed_bytes = 0
+        self._buffer = bytearray()
+        self._frame_fill = 0
+        self._closed = False
+        self._error = None
+        self._queue = queue.Queue(QUEUE_CHUNKS)
+        self._thread = threading.Thread(target=self._run, name="bundler-compress", daemon=True)
+        self._thread.start()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._check()
+        n = len(data)
+        self._buffer += data
+        self._frame_fill += n
+        if len(self._buffer) >= CHUNK_BYTES:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return n
+
+    def end_frame(self, force=False):
+        """
+        Finish the current frame here if it has reached frame_bytes, or if
+        force is set (and it is not empty), so the next byte starts a new one.
+        """
+        if self._frame_fill and (force or self._frame_fill >= self.frame_bytes):
+            if self._buffer:
+                self._put(bytes(self._buffer))
+                self._buffer.clear()
+            self._put(_END_FRAME)
+            self._frame_fill = 0
+
+    def flush(self):
+        self._check()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.end_frame(force=True)
+            self._put(_CLOSE)
+        finally:
+            self._thread.join()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self._abort()
+
+    def _abort(self):
+        """Stop the thread without finishing the output (it is being discarded)."""
+        if not self._closed:
+            self._closed = True
+            self._error = self._error or RuntimeError("compressed output aborted")
+            self._drain()
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+    def _put(self, item):
+        while True:
+            self._check()
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _run(self):
+        compressor = None
+        uncompressed = 0
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _CLOSE:
+                    return
+                if self._error is not None:
+                    continue
+                if item is _END_FRAME:
+                    if compressor is not None:
+                        self._emit(compressor.flush())
+                        compressor = None
+                    continue
+                if compressor is None:
+                    compressor = self.codec.compressor(self.level)
+                    self.frames.append((uncompressed, self.compressed_bytes))
+                uncompressed += len(item)
+                self._emit(compressor.compress(item))
+        except BaseException as e:
+            self._error = e
+            self._drain()
+
+    def _emit(self, data):
+        if data:
+            self.raw.write(data)
+            self.compressed_bytes += len(data)
+
+
+def iter_decompressed(f, codec, start=0, chunk_size=1024 * 1024):
+    """
+    Yield the uncompressed bytes of a framed stream, starting from the frame
+    that begins at compressed offset start of the binary file f.
+    """
+    codec = get_codec(codec)
+    f.seek(start)
+    decompressor = codec.decompressor()
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            return
+        while data:
+            out = decompressor.decompress(data)
+            if out:
+                yield out
+            if not decompressor.eof:
+                break
+            # The frame ended inside this chunk; the rest starts the next one.
+            data = decompressor.unused_data
+            decompressor = codec.decompressor()
@@ -0,0 +1,91 @@
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# ==============================================================================
+# CROSS-PROJECT DEDUPLICATION
+# ==============================================================================
+# Finds files with identical content across all projects of a bundle, so only
+# the first copy is written and later ones become a one-line reference.
+#
+# Most files are ruled out without reading them at all:
+#
+#   1. stat size          -> only sizes shared by two or more files go on
+#   2. hash of a prefix   -> only prefixes shared by two or more files go on
+#   3. streamed full hash -> identical digests are duplicates
+#
+# so a file is hashed in full only if another file has the same size and
+# starts with the same bytes.
+
+PREFIX_BYTES = 4096
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Files smaller than this are not worth a reference line.
+DEDUP_MIN_BYTES = 256
+
+
+def _hash_file(path, limit=None):
+    """SHA-256 of the file's first `limit` bytes (all of it if None), read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = limit
+        while remaining is None or remaining > 0:
+            block = f.read(HASH_BLOCK_SIZE if remaining is None else min(remaining, HASH_BLOCK_SIZE))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.digest()
+
+def _try_hash(args):
+    entry, limit = args
+    try:
+        return entry, _hash_file(entry.path, limit)
+    except OSError:
+        return entry, None
+
+def _regroup(groups, limit, executor):
+    """Split each group by content hash (of the first `limit` bytes); keep groups of two or more."""
+    jobs = [(entry, limit) for group in groups for entry in group]
+    split = defaultdict(list)
+    for entry, digest in executor.map(_try_hash, jobs):
+        if digest is not None:
+            split[entry.size, digest].append(entry)
+    return [group for group in split.values() if len(group) > 1]
+
+def find_duplicates(entries, policy=None, workers=8):
+    """
+    Return {path: entry of the first identical file} for every entry whose
+    content equals an earlier one in `entries` (earlier in iteration order).
+
+    Files a ContentPolicy would not read anyway (binary extensions, oversized
+    files that are not truncated) are left alone.
+    """
+    by_size = defaultdict(list)
+    order = {}
+    for position, entry in enumerate(entries):
+        if entry.size < DEDUP_MIN_BYTES or (policy is not None and policy.skips_read(entry)):
+            continue
+        by_size[entry.size].append(entry)
+        order[entry.path] = position
+    groups = [group for group in by_size.values() if len(group) > 1]
+    if not groups:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="bundler-dedup") as executor:
+        groups = _regroup(groups, PREFIX_BYTES, executor)
+        # Files no longer than the prefix are already fully hashed.
+        small = [g for g in groups if g[0].size <= PREFIX_BYTES]
+        large = [g for g in groups if g[0].size > PREFIX_BYTES]
+        groups = small + _regroup(large, None, executor)
+
+    duplicates = {}
+    for group in groups:
+        group.sort(key=lambda e: order[e.path])
+        for entry in group[1:]:
+            duplicates[entry.path] = group[0]
+    return duplicates
+
+def duplicate_reference(original, size):
+    return f"*** Identical to {original} ({size:,} bytes); contents not repeated ***"
@@ -0,0 +1,706 @@
+import hashlib
+import itertools
+import mmap
+import os
+import sys
+import time
+from collections import namedtuple
+from dataclasses import asdict, dataclass, field, replace
+from functools import partial
+
+from .compress import CompressedStream
+from .dedup import duplicate_reference, find_duplicates
+from .gitindex import scan_git_projects
+from .ignore import IGNORE_FILE_NAMES, IgnoreMatcher
+from .index import INDEX_SUFFIX, BundleIndex, BundleIndexError
+from .manifest import MANIFEST_SUFFIX, Manifest, OFFSET, LENGTH, DIGEST
+from .progress import as_reporter
+from .reader import MMAP_THRESHOLD, RawFile, read_ahead, read_entry, read_entry_raw
+from .scanner import scan_projects
+from .sniff import ContentPolicy
+from .tree import iter_tree_lines
+
+# ==============================================================================
+# HEADLESS BUNDLING ENGINE
+# ==============================================================================
+# The bundle is produced by a chain of generators:
+#
+#   walk -> filter -> read -> render -> write
+#
+# Walking and filtering happen in a single scandir pass (see scanner.py), and
+# reading runs ahead of rendering on a thread pool (see reader.py).
+#
+# Nothing here touches Tkinter, so the same code drives the GUI, the
+# command line (`python -m bundler`) and anything else that imports it.
+
+# .gitignore-style patterns (see ignore.py).
+DEFAULT_IGNORE = (
+    '.git', '.vscode', 'node_modules', 'dist', 'build', '__pycache__',
+    '.DS_Store', '*.log', '*.pyc',
+)
+
+SEPARATOR = "=" * 40
+SUBSEPARATOR = "-" * 20
+
+COPY_BLOCK_SIZE = 1024 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+TREE_BLOCK_LINES = 1024
+
+# Pre-encoded framing for passthrough mode, where file bodies are raw bytes.
+FILE_HEADER_PREFIX = b"--- File: "
+FILE_HEADER_SUFFIX = b" ---\n\n"
+FILE_FOOTER = ("\n\n" + SEPARATOR + "\n\n").encode('utf-8')
+
+
+@dataclass
+class BundleOptions:
+    """Settings that control what goes into a bundle."""
+    ignore: tuple = DEFAULT_IGNORE
+    # Also honour .gitignore / .bundleignore files found in the projects.
+    ignore_files: tuple = IGNORE_FILE_NAMES
+    # Line ending used in the output, matching a file opened in text mode.
+    newline: str = os.linesep
+    # Exact file names that are always skipped (e.g. the bundle file itself).
+    exclude: set = field(default_factory=set)
+    # Read-ahead: threads prefetching files and the most bytes they may hold.
+    read_workers: int = 8
+    read_ahead_bytes: int = 32 * 1024 * 1024
+    # Incremental builds: reuse unchanged segments of the previous bundle.
+    incremental: bool = False
+    manifest_path: str = None
+    # Also check content hashes, not just stat data, before reusing a segment.
+    verify_hash: bool = False
+    # Handling of binary and oversized files (None reads everything as text).
+    content: ContentPolicy = field(default_factory=ContentPolicy)
+    # Copy files that are valid UTF-8 byte-for-byte (zero-copy where the OS
+    # allows) instead of decoding and re-encoding them. Their line endings are
+    # kept as they are, and the bundle's own framing always uses "\n".
+    passthrough: bool = False
+    # Write a companion index of file offsets, lengths and hashes (see index.py).
+    index: bool = False
+    index_path: str = None
+    # Compress the output: 'gzip', 'bz2', 'xz' or 'zstd' (see compress.py),
+    # at the codec's default level unless one is given.
+    compression: str = None
+    compression_level: int = None
+    # Split the output into numbered chunks of at most chunk_size bytes or
+    # estimated tokens (chunk_unit 'bytes' or 'tokens'; see chunks.py).
+    chunk_size: int = None
+    chunk_unit: str = "bytes"
+    # Write files with identical content (across all projects) only once;
+    # later copies become a reference to the first (see dedup.py).
+    dedupe: bool = False
+    # File structure tree: show folders holding more than tree_collapse_above
+    # files, or at depth tree_max_depth (1 = top level), as one summary line.
+    tree_collapse_above: int = None
+    tree_max_depth: int = None
+    # List files from the git index instead of walking the folders: 'tracked'
+    # for every tracked file, 'changed' for only those that differ from the
+    # index or, if git_base names a commit, from that commit (see gitindex.py).
+    git_files: str = None
+    git_base: str = None
+
+    def ignore_matcher(self):
+        return IgnoreMatcher.from_patterns(self.ignore, self.exclude, self.ignore_files)
+
+    def line_ending(self):
+        return "\n" if self.passthrough else self.newline
+
+    def read_cost(self, entry):
+        """Memory (in bytes) a read of entry may hold in the read-ahead window."""
+        cost = self.content.read_cost(entry) if self.content else max(entry.size, 1)
+        # Big passthrough files are handed over as open files, not bytes; this
+        # still caps how many of them can be open at once.
+        return min(cost, MMAP_THRESHOLD) if self.passthrough else cost
+
+    def render_key(self):
+        """Settings that change how a file segment is rendered; cached segments must match."""
+        return {
+            "newline": self.line_ending(),
+            "content": asdict(self.content) if self.content else None,
+            "passthrough": self.passthrough,
+        }
+
+
+# A rendered file. Exactly one of text / splice is set; splice is the
+# (offset, length) of an identical segment in the previous bundle. In
+# passthrough mode text may also be a tuple of bytes / RawFile parts.
+# cacheable is False when the file could not be read. project is the
+# project's position in the bundle and path the '/'-separated display path.
+# same_as is the (project, path) of the first copy if this file is a
+# duplicate written as a reference.
+FileSegment = namedtuple("FileSegment", "entry project path text splice digest cacheable same_as", defaults=(None,))
+
+# A run of files unchanged since the previous bundle, spliced as one piece
+# rather than one FileSegment each: files holds (entry, manifest record)
+# pairs in bundle order.
+SplicedRun = namedtuple("SplicedRun", "project files")
+
+# Where a FileSegment ended up in the output, as recorded by BundleWriter.
+# The file's body starts header_length bytes into the segment and stops
+# footer_length bytes before its end.
+WrittenSegment = namedtuple(
+    "WrittenSegment",
+    "entry project path offset length header_length footer_length digest cacheable body_sha256 same_as",
+)
+
+# Where a SplicedRun ended up: its files were written back to back from offset on.
+WrittenRun = namedtuple("WrittenRun", "project files offset")
+
+
+# --- Render ---
+
+def render_bundle_header(project_count):
+    return "=" * 15 + " PROJECT BUNDLE " + "=" * 15 + "\n" + f"Bundled {project_count} project(s).\n\n"
+
+def render_project_header(project_name, relative_paths, collapse_above=None, max_depth=None):
+    """Yield the project banner and its file structure tree (see tree.iter_tree_lines)."""
+    yield f"PROJECT BUNDLE: {project_name}\n" + SEPARATOR + "\n\n"
+    yield "File Structure:\n" + SUBSEPARATOR + "\n" + f"{project_name}/\n"
+    lines = iter_tree_lines(relative_paths, collapse_above, max_depth)
+    # Handed on in blocks of lines, so a huge tree costs neither one string
+    # per line downstream nor one string for the whole tree.
+    while True:
+        block = list(itertools.islice(lines, TREE_BLOCK_LINES))
+        if not block:
+            break
+        yield "\n".join(block) + "\n"
+    yield "\n\n" + "File Contents:\n" + SUBSEPARATOR + "\n\n"
+
+def render_file_header(display_path):
+    return f"--- File: {display_path} ---\n\n"
+
+def render_file(display_path, content):
+    if not isinstance(content, str):
+        # Passthrough: bytes or a RawFile, framed with pre-encoded constants.
+        return (FILE_HEADER_PREFIX + display_path.encode('utf-8') + FILE_HEADER_SUFFIX, content, FILE_FOOTER)
+    return render_file_header(display_path) + content + "\n\n" + SEPARATOR + "\n\n"
+
+def render_bundle(project_dirs, options=None, progress=None, cache=None, headers=True, projects=None, project_headers=None):
+    """
+    Yield a complete bundle piece by piece: plain strings for headers and trees,
+    and a FileSegment for each file. With headers=False, only the FileSegments.
+
+    progress is a ProgressReporter or a callback for its messages.
+    cache, if given, is the Manifest of the previous bundle; files it vouches
+    for are not read, and each run of them comes back as one SplicedRun.
+    projects, if given, are the ProjectScans of project_dirs, already made
+    (e.g. kept up to date by watch.py); the folders are then not scanned.
+    project_headers, if given, holds for each project the pieces
+    render_project_header() yields for it, rendered earlier.
+    """
+    options = options or BundleOptions()
+    reporter = as_reporter(progress)
+
+    if projects is None:
+        reporter.set_phase("Scanning files...")
+        if options.git_files:
+            projects = scan_git_projects(project_dirs, options.ignore_matcher(), options.git_files, options.git_base)
+        else:
+            projects = scan_projects(project_dirs, options.ignore_matcher())
+    duplicates = {}
+    if options.dedupe:
+        reporter.set_phase("Looking for duplicate files...")
+        duplicates = find_duplicates(
+            itertools.chain.from_iterable(p.entries for p in projects), options.content, options.read_workers,
+        )
+    reporter.start(sum(len(p.entries) for p in projects), sum(p.total_bytes for p in projects))
+
+    if headers:
+        yield render_bundle_header(len(project_dirs))
+
+    all_entries = itertools.chain.from_iterable(p.entries for p in projects)
+    read_one = read_entry_raw if options.passthrough else read_entry
+    # Passthrough copies large files without looking at them, so their
+    # read-time hash doubles as the index hash.
+    read = partial(read_one, policy=options.content, hashing=options.verify_hash or (options.index and options.passthrough))
+    # Per project, the cache's record for each entry (None: read the file).
+    hits = [itertools.repeat(None)] * len(projects)
+    if cache and options.verify_hash:
+        # Every file is read and hashed; unchanged ones are still spliced.
+        digests = {}
+        for project_number, project in enumerate(projects):
+            for entry in project.entries:
+                rec = cache.record(project_number, entry)
+                if rec:
+                    digests[entry.path, entry.rel_path] = rec[DIGEST]
+
+        def read(entry):
+            return read_one(entry, options.content, hashing=True, expected_digest=digests.get((entry.path, entry.rel_path)))
+    elif cache:
+        hits = [cache.unchanged(n, p.entries) for n, p in enumerate(projects)]
+        all_entries = (
+            entry for project, recs in zip(projects, hits) for entry, rec in zip(project.entries, recs) if rec is None
+        )
+    if duplicates:
+        all_entries = (e for e in all_entries if e.path not in duplicates)
+
+    # One read-ahead window spans all projects so it does not drain at each boundary.
+    contents = read_ahead(
+        all_entries, read=read, workers=options.read_workers, max_bytes=options.read_ahead_bytes,
+        cost=options.read_cost,
+    )
+    # First copies of duplicated files: path -> (project, display path, status).
+    first_copies = {e.path for e in duplicates.values()}
+    originals = {}
+    for project_number, project in enumerate(projects):
+        if headers and project_headers:
+            yield from project_headers[project_number]
+        elif headers:
+            yield from render_project_header(
+                os.path.basename(project.project_dir), (e.rel_path for e in project.entries),
+                options.tree_collapse_above, options.tree_max_depth,
+            )
+        run = []
+        for entry, rec in zip(project.entries, hits[project_number]):
+            if rec:
+                run.append((entry, rec))
+                continue
+            if run:
+                yield _spliced_run(project_number, run, reporter)
+                run = []
+            display_path = entry.rel_path.replace(os.sep, '/')
+            reporter.advance(entry.size, display_path)
+
+            original = duplicates.get(entry.path)
+            if original is not None:
+                first = originals.get(original.path)
+                if first is not None and first[2] == 'skipped':
+                    continue
+                if first is not None and first[2] == 'ok':
+                    name = os.path.basename(projects[first[0]].project_dir) + "/" + first[1]
+                    text = render_file(display_path, duplicate_reference(name, entry.size))
+                    yield FileSegment(entry, project_number, display_path, text, None, None, False, first[:2])
+                    continue
+                # The first copy could not be read; try this one after all.
+                result = read(entry)
+            else:
+                _, result = next(contents)
+            if entry.path in first_copies:
+                originals[entry.path] = (project_number, display_path, result.status)
+            if result.status == 'skipped':
+                continue
+            if result.status == 'unchanged':
+                rec = cache.record(project_number, entry)
+                yield FileSegment(entry, project_number, display_path, None, (rec[OFFSET], rec[LENGTH]), result.digest, True)
+            else:
+                text = render_file(display_path, result.content)
+                yield FileSegment(entry, project_number, display_path, text, None, result.digest, result.status == 'ok')
+        if run:
+            yield _spliced_run(project_number, run, reporter)
+    reporter.finish()
+
+def _spliced_run(project_number, run, reporter):
+    """A SplicedRun of the (entry, manifest record) pairs in run."""
+    reporter.advance(sum(entry.size for entry, _ in run), run[-1][0].rel_path.replace(os.sep, '/'), files=len(run))
+    return SplicedRun(project_number, run)
+
+
+# --- Write ---
+
+class BundleWriter:
+    """
+    Writes rendered pieces to a binary stream as UTF-8, optionally remembering
+    where each file segment landed so the next build can reuse it.
+
+    Splices are copied from `previous` (the old bundle, opened for reading);
+    runs of adjacent splices are coalesced into a single copy. RawFile parts
+    are copied in the kernel (copy_file_range / sendfile) when the output is
+    a real file descriptor, and through mmap otherwise.
+    """
+
+    def __init__(self, stream, newline="\n", previous=None, record=False, hash_bodies=False, previous_hashes=None):
+        self.stream = stream
+        self.newline = newline
+        self.previous = previous
+        self.offset = 0
+        # WrittenSegments, if record is set; bodies are hashed for the index
+        # if hash_bodies is set (previous_hashes saves rehashing splices).
+        # Without hashing, a SplicedRun is recorded as one WrittenRun in runs
+        # instead of a WrittenSegment per file.
+        self.segments = [] if record else None
+        self.runs = [] if record else None
+        self.hash_bodies = hash_bodies
+        self.previous_hashes = previous_hashes or {}
+        self._footer_length = len(self.encode("\n\n" + SEPARATOR + "\n\n"))
+        self._header_frame_length = len(self.encode(render_file_header("")))
+        self._splice_start = None
+        self._splice_length = 0
+        try:
+            self._out_fd = stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            self._out_fd = None
+        self._kernel_copies = [name for name in ("copy_file_range", "sendfile") if hasattr(os, name)]
+        # Compressed streams start a new frame wherever the output switches
+        # between headers / trees and file contents.
+        self._end_frame = getattr(stream, "end_frame", None)
+        self._in_files = False
+
+    def encode(self, text):
+        if self.newline != "\n":
+            text = text.replace("\n", self.newline)
+        return text.encode('utf-8')
+
+    def write(self, piece):
+        is_file = not isinstance(piece, str)
+        if self._end_frame is not None:
+            self.flush_splice()
+            self._end_frame(force=is_file != self._in_files)
+            self._in_files = is_file
+        if not is_file:
+            self.write_bytes(self.encode(piece))
+            return
+        if isinstance(piece, SplicedRun):
+            self.write_run(piece)
+            return
+        start = self.offset
+        header_length = self._header_length(piece.path) if self.segments is not None else 0
+        body_hash = None
+        if piece.splice is not None:
+            offset, length = piece.splice
+            self.splice(offset, length)
+            if self.hash_bodies:
+                body_hash = self._spliced_body_hash(piece.project, piece.path, offset, length, header_length)
+        elif isinstance(piece.text, str):
+            data = self.encode(piece.text)
+            if self.hash_bodies:
+                with memoryview(data) as view, view[header_length:len(data) - self._footer_length] as body:
+                    body_hash = hashlib.sha256(body).hexdigest()
+            self.write_bytes(data)
+        else:
+            header, body, footer = piece.text
+            self.write_bytes(header)
+            if isinstance(body, RawFile):
+                # Read with hashing on, so the digest is that of these bytes.
+                self.write_raw_file(body)
+                body_hash = piece.digest
+            else:
+                self.write_bytes(body)
+                if self.hash_bodies:
+                    body_hash = hashlib.sha256(body).hexdigest()
+            self.write_bytes(footer)
+        if self.segments is not None:
+            self.segments.append(WrittenSegment(
+                piece.entry, piece.project, piece.path, start, self.offset - start, header_length,
+                self._footer_length, piece.digest, piece.cacheable, body_hash, piece.same_as,
+            ))
+
+    def write_run(self, run):
+        """Splice a SplicedRun and record it (see runs)."""
+        if self.segments is not None and self.hash_bodies:
+            for entry, rec in run.files:
+                self._write_spliced_file(run.project, entry, rec)
+            return
+        if self.runs is not None:
+            self.runs.append(WrittenRun(run.project, run.files, self.offset))
+        # Runs of adjacent segments are coalesced here rather than through
+        # splice(): this loop covers every unchanged file of the build.
+        start, length = self._splice_start, self._splice_length
+        for _, rec in run.files:
+            if start is not None and start + length == rec[OFFSET]:
+                length += rec[LENGTH]
+            else:
+                self._splice_start, self._splice_length = start, length
+                self.flush_splice()
+                start, length = rec[OFFSET], rec[LENGTH]
+            self.offset += rec[LENGTH]
+        self._splice_start, self._splice_length = start, length
+
+    def _write_spliced_file(self, project, entry, rec):
+        path = entry.rel_path.replace(os.sep, '/')
+        offset, length = rec[OFFSET], rec[LENGTH]
+        start = self.offset
+        self.splice(offset, length)
+        header_length = self._header_length(path)
+        self.segments.append(WrittenSegment(
+            entry, project, path, start, length, header_length, self._footer_length, rec[DIGEST], True,
+            self._spliced_body_hash(project, path, offset, length, header_length), None,
+        ))
+
+    def _header_length(self, path):
+        """Encoded length of render_file_header(path)."""
+        return self._header_frame_length + len(self.encode(path))
+
+    def _spliced_body_hash(self, project, path, offset, length, header_length):
+        return self.previous_hashes.get((project, path)) or self._hash_previous(
+            offset + header_length, length - header_length - self._footer_length)
+
+    def write_bytes(self, data):
+        self.flush_splice()
+        self.stream.write(data)
+        self.offset += len(data)
+
+    def write_raw_file(self, raw_file):
+        """Copy an open RawFile to the output and close it."""
+        self.flush_splice()
+        src, length = raw_file
+        try:
+            copied = self._kernel_copy(src.fileno(), length) if self._out_fd is not None else 0
+            if copied < length:
+                with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    with memoryview(mapped) as view:
+                        for start in range(copied, length, COPY_BLOCK_SIZE):
+                            self.stream.write(view[start:min(start + COPY_BLOCK_SIZE, length)])
+        finally:
+            src.close()
+        self.offset += length
+
+    def _kernel_copy(self, src_fd, length):
+        """Copy up to length bytes from src_fd in the kernel; returns how many were copied."""
+        if not self._kernel_copies:
+            return 0
+        self.stream.flush()
+        copied = 0
+        while copied < length and self._kernel_copies:
+            method = self._kernel_copies[0]
+            try:
+                if method == "copy_file_range":
+                    n = os.copy_file_range(src_fd, self._out_fd, length - copied, copied)
+                else:
+                    n = os.sendfile(self._out_fd, src_fd, copied, length - copied)
+            except OSError:
+                # Not supported for this pair of files (e.g. a pipe, another
+                # file system); do not try this method again.
+                self._kernel_copies.pop(0)
+                continue
+            if n == 0:
+                break
+            copied += n
+        if copied and self.stream.seekable():
+            # The kernel moved the descriptor; keep the buffered stream in sync.
+            self.stream.seek(0, os.SEEK_END)
+        return copied
+
+    def _hash_previous(self, offset, length):
+        digest = hashlib.sha256()
+        self.previous.seek(offset)
+        while length > 0:
+            block = self.previous.read(min(length, COPY_BLOCK_SIZE))
+            if not block:
+                break
+            digest.update(block)
+            length -= len(block)
+        return digest.hexdigest()
+
+    def splice(self, offset, length):
+        if self._splice_start is not None and self._splice_start + self._splice_length == offset:
+            self._splice_length += length
+        else:
+            self.flush_splice()
+            self._splice_start, self._splice_length = offset, length
+        self.offset += length
+
+    def flush_splice(self):
+        if self._splice_start is None:
+            return
+        self.previous.seek(self._splice_start)
+        remaining = self._splice_length
+        while remaining:
+            block = self.previous.read(min(remaining, COPY_BLOCK_SIZE))
+            if not block:
+                raise OSError("previous bundle is shorter than its manifest says")
+            self.stream.write(block)
+            remaining -= len(block)
+        self._splice_start, self._splice_length = None, 0
+
+    def close(self):
+        self.flush_splice()
+
+
+def write_segments(segments, stream, newline="\n", index=False):
+    """Write rendered pieces to a binary stream; index=True records and hashes file segments."""
+    writer = BundleWriter(stream, newline, record=index, hash_bodies=index)
+    for piece in segments:
+        writer.write(piece)
+    writer.close()
+    return writer
+
+def write_index(project_dirs, writer, index_path, compressed=None, bundle_path=None):
+    """
+    Save the BundleIndex of what writer wrote, with offsets relative to where
+    it started. compressed is the CompressedStream the writer wrote through.
+    bundle_path is the finished bundle, if it is a file, so the index can
+    tell later whether it was rewritten.
+    """
+    projects = [os.path.basename(os.fspath(d)) for d in project_dirs]
+    if compressed is None:
+        index = BundleIndex.from_segments(projects, writer.segments, writer.offset)
+    else:
+        index = BundleIndex.from_segments(projects, writer.segments, compressed.compressed_bytes, {
+            "codec": compressed.codec_name, "frames": [list(frame) for frame in compressed.frames],
+        })
+    if bundle_path is not None:
+        index.bundle_mtime_ns = os.stat(bundle_path).st_mtime_ns
+    index.save(os.fspath(index_path))
+
+def remove_index(index_path):
+    """
+    Delete the index left by an earlier build of a bundle just written
+    without one: its offsets describe the old bundle.
+    """
+    try:
+        os.unlink(index_path)
+    except FileNotFoundError:
+        pass
+
+def write_bundle(project_dirs, stream, options, progress=None):
+    """
+    Render and write a bundle to a binary stream, compressing it if the
+    options ask for it. Returns (writer, CompressedStream or None).
+    """
+    segments = render_bundle(project_dirs, options, progress)
+    if not options.compression:
+        return write_segments(segments, stream, options.line_ending(), index=options.index), None
+    with CompressedStream(stream, options.compression, options.compression_level) as compressed:
+        writer = write_segments(segments, compressed, options.line_ending(), index=options.index)
+    return writer, compressed
+
+def _previous_index_hashes(project_dirs, output_path, index_path):
+    """Body hashes from the previous bundle's index, if it still describes that bundle."""
+    try:
+        previous = BundleIndex.load_for(output_path, index_path)
+    except (BundleIndexError, OSError, KeyError, TypeError):
+        return None
+    if previous.projects != [os.path.basename(os.fspath(d)) for d in project_dirs]:
+        return None
+    return previous.hashes()
+
+
+def _create_temp(output_path):
+    """
+    Create a uniquely named temp file next to output_path; returns (fd, path).
+    Unlike tempfile.mkstemp (always 0o600) it is created with mode 0o666,
+    which the OS reduces by the umask, so a new bundle gets the same mode as
+    any file the process creates, without reading the process-wide umask.
+    """
+    folder = os.path.dirname(os.path.abspath(output_path))
+    prefix = "." + os.path.basename(output_path) + "."
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        path = os.path.join(folder, prefix + os.urandom(6).hex() + ".tmp")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+
+def companion_paths(output_path, options):
+    """(manifest path, index path) that belong to output_path."""
+    output_path = os.fspath(output_path)
+    return (
+        options.manifest_path or output_path + MANIFEST_SUFFIX,
+        options.index_path or output_path + INDEX_SUFFIX,
+    )
+
+def bundle_incremental(project_dirs, output_path, options, progress=None, projects=None, project_headers=None):
+    """
+    Rebuild output_path, splicing unchanged file segments from the previous
+    bundle. The new bundle is written to a temporary file and renamed into
+    place, so it is byte-identical to a full rebuild and never half-written.
+    projects and project_headers are passed on to render_bundle().
+    """
+    output_path = os.fspath(output_path)
+    manifest_path, index_path = companion_paths(output_path, options)
+    render_key = options.render_key()
+    cache = Manifest.load(manifest_path, output_path, render_key, project_dirs)
+    writer, manifest = write_incremental(project_dirs, output_path, options, cache, progress, projects, project_headers)
+    manifest.save(manifest_path, output_path, render_key, project_dirs)
+    if options.index:
+        write_index(project_dirs, writer, index_path, bundle_path=output_path)
+    else:
+        remove_index(index_path)
+    return writer
+
+def write_incremental(project_dirs, output_path, options, cache, progress=None, projects=None, project_headers=None):
+    """
+    The bundle-writing half of bundle_incremental(), for callers that keep
+    the Manifest of output_path in memory (watch.py): splice what cache
+    vouches for, rename the new bundle into place, and return the writer
+    and the new bundle's Manifest, unsaved.
+    """
+    output_path = os.fspath(output_path)
+    manifest_path, index_path = companion_paths(output_path, options)
+    fd, tmp_path = _create_temp(output_path)
+    options = replace(options, exclude=set(options.exclude) | {
+        os.path.basename(output_path), os.path.basename(manifest_path), os.path.basename(tmp_path),
+        os.path.basename(index_path),
+    })
+    previous_hashes = _previous_index_hashes(project_dirs, output_path, index_path) if cache and options.index else None
+    built_ns = time.time_ns()
+    try:
+        with os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            previous = open(output_path, 'rb') if cache else None
+            try:
+                writer = BundleWriter(
+                    f, options.line_ending(), previous=previous, record=True,
+                    hash_bodies=options.index, previous_hashes=previous_hashes,
+                )
+                for piece in render_bundle(project_dirs, options, progress, cache=cache, projects=projects, project_headers=project_headers):
+                    writer.write(piece)
+                writer.close()
+            finally:
+                if previous:
+                    previous.close()
+        try:
+            # A bundle being replaced keeps its mode.
+            os.chmod(tmp_path, os.stat(output_path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    manifest = Manifest.from_segments(
+        writer.segments, built_ns, len(project_dirs), keep_racy=options.verify_hash, runs=writer.runs,
+    )
+    return writer, manifest
+
+
+def bundle(project_dirs, output, options=None, progress=None):
+    """
+    Bundle project_dirs into output.
+
+    output is a file path, '-' for stdout, or an already open binary stream.
+    progress is a ProgressReporter to poll, or a callback that receives the
+    same message dicts the GUI queue uses (throttled, not one per file).
+    With options.index, the index goes to options.index_path, which defaults
+    to `<output>.index.json` and must be given when output is a stream.
+    With options.chunk_size, output names the chunks (`out.txt` becomes
+    `out.001.txt`, `out.002.txt`, ...) and their paths are returned.
+    """
+    options = options or BundleOptions()
+    is_path = output != '-' and isinstance(output, (str, os.PathLike))
+    if options.chunk_size:
+        if not is_path or options.incremental or options.index:
+            raise ValueError("chunked bundles need an output path and cannot be incremental or indexed")
+        from .chunks import bundle_chunks
+        return bundle_chunks(project_dirs, output, options, progress)
+    if options.index and not is_path and not options.index_path:
+        raise ValueError("an index_path is required to index a bundle written to a stream")
+    if options.incremental and options.compression:
+        raise ValueError("incremental bundles cannot be compressed")
+    if options.incremental and options.dedupe:
+        raise ValueError("incremental bundles cannot be deduplicated")
+    if is_path and options.incremental:
+        bundle_incremental(project_dirs, output, options, progress)
+        return
+
+    index_path = options.index_path
+    if output == '-':
+        writer, compressed = write_bundle(project_dirs, sys.stdout.buffer, options, progress)
+        sys.stdout.buffer.flush()
+    elif is_path:
+        index_path = index_path or os.fspath(output) + INDEX_SUFFIX
+        options = replace(options, exclude=set(options.exclude) | {
+            os.path.basename(output), os.path.basename(index_path),
+        })
+        with open(output, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            writer, compressed = write_bundle(project_dirs, f, options, progress)
+    else:
+        writer, compressed = write_bundle(project_dirs, output, options, progress)
+    if options.index:
+        write_index(project_dirs, writer, index_path, compressed, output if is_path else None)
+    elif is_path:
+        remove_index(index_path)
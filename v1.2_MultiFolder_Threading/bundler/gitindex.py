@@ -0,0 +1,218 @@
+import hashlib
+import os
+import stat
+import struct
+import sys
+from collections import namedtuple
+
+from .gitobjects import MODE_GITLINK, MODE_TREE, GitError, GitRepository
+from .ignore import PathFilter
+from .scanner import FileEntry, ProjectScan
+
+# ==============================================================================
+# GIT INDEX SCANNER
+# ==============================================================================
+# Lists a project's files from its repository's .git/index (versions 2, 3 and
+# 4) instead of walking the folders: exactly the tracked files, in one read,
+# with no git binary. Each listed file is still stat'ed, for the same FileEntry
+# data the walking scanner records.
+#
+#   tracked   every tracked file that exists in the checkout
+#   changed   only files whose content differs from the index, or, given a
+#             base revision, from that commit (staged changes included)
+#
+# "Changed" is decided like `git status` does: a file whose stat data matches
+# what the index recorded is unchanged; any other file is hashed as a blob and
+# compared by id. Only files whose stat data changed are read, so a changed-
+# files bundle of a large checkout costs about one stat per tracked file.
+#
+# Content filters (autocrlf, clean filters) are not applied when hashing, so
+# with those a file can show up as changed that git considers unchanged.
+
+GIT_MODES = ("tracked", "changed")
+
+# One index entry, as recorded when the file was last staged or refreshed.
+IndexEntry = namedtuple("IndexEntry", "path mode oid size mtime_ns ctime_ns ino stage flags")
+
+# Entry flags.
+ASSUME_VALID = 0x8000
+_EXTENDED = 0x4000
+# Extended flags (version 3 and later), shifted up by 16 in IndexEntry.flags.
+SKIP_WORKTREE = 0x4000 << 16
+INTENT_TO_ADD = 0x2000 << 16
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _varint(data, pos):
+    """git's offset varint, as used for path prefixes in index version 4."""
+    c = data[pos]
+    pos += 1
+    value = c & 0x7F
+    while c & 0x80:
+        c = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (c & 0x7F)
+    return value, pos
+
+def read_index(path, hash_size=20):
+    """Parse a git index file into a list of IndexEntry, in index (path) order."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 12 + hash_size or data[:4] != b"DIRC":
+        raise GitError(f"not a git index: {path}")
+    version, count = struct.unpack_from(">II", data, 4)
+    if version not in (2, 3, 4):
+        raise GitError(f"unsupported git index version {version}: {path}")
+    checksum = data[-hash_size:]
+    if checksum != bytes(hash_size):  # all zeros with index.skipHash
+        digest = hashlib.sha256 if hash_size == 32 else hashlib.sha1
+        if digest(data[:-hash_size]).digest() != checksum:
+            raise GitError(f"git index checksum mismatch: {path}")
+
+    fixed = struct.Struct(f">10I{hash_size}sH")
+    entries = []
+    pos = 12
+    previous = b""
+    for _ in range(count):
+        (ctime_s, ctime_ns, mtime_s, mtime_ns, _dev, ino, mode, _uid, _gid, size,
+         oid, flags) = fixed.unpack_from(data, pos)
+        start = pos
+        pos += fixed.size
+        if flags & _EXTENDED and version >= 3:
+            flags |= struct.unpack_from(">H", data, pos)[0] << 16
+            pos += 2
+        if version == 4:
+            strip, pos = _varint(data, pos)
+            end = data.index(b"\0", pos)
+            name = previous[:len(previous) - strip] + data[pos:end]
+            pos = end + 1
+        else:
+            end = data.index(b"\0", pos)
+            name = data[pos:end]
+            # Entries are NUL-padded to a multiple of 8 bytes.
+            pos = start + ((end - start) // 8 + 1) * 8
+        previous = name
+        entries.append(IndexEntry(
+            name, mode, oid, size, mtime_s * 1_000_000_000 + mtime_ns, ctime_s * 1_000_000_000 + ctime_ns,
+            ino, (flags >> 12) & 3, flags,
+        ))
+    return entries
+
+
+def blob_id(path, hash_name="sha1", symlink=False):
+    """The id git would give the file at path as a blob (a symlink's is its target)."""
+    digest = hashlib.new(hash_name)
+    if symlink:
+        target = os.fsencode(os.readlink(path))
+        digest.update(b"blob %d\0" % len(target) + target)
+        return digest.digest()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        digest.update(b"blob %d\0" % size)
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.digest()
+
+def _stat_matches(entry, st, index_mtime_ns):
+    """Whether st still matches what the index recorded, so the file is unchanged."""
+    if entry.flags & (ASSUME_VALID | SKIP_WORKTREE):
+        return True  # git does not look at these files either
+    if entry.mtime_ns >= index_mtime_ns:
+        # "Racily clean": modified in the same instant the index was written,
+        # so the stat data cannot be trusted.
+        return False
+    return (
+        entry.size == st.st_size & 0xFFFFFFFF
+        and entry.mtime_ns == st.st_mtime_ns
+        and entry.ctime_ns == st.st_ctime_ns
+        and entry.ino == st.st_ino & 0xFFFFFFFF
+    )
+
+
+def iter_git_files(project_dir, matcher, mode="tracked", base=None):
+    """
+    Yield a FileEntry for every tracked, non-ignored file under project_dir
+    (which may be any folder of a checkout), in index order.
+
+    With mode 'changed', only files that differ from the index, or from the
+    commit named by base if given. Files missing from the checkout are left
+    out. Ignore files (.gitignore, ...) do not apply to tracked files; the
+    matcher's own patterns and literal names do.
+    """
+    if mode not in GIT_MODES:
+        raise ValueError(f"git mode must be one of {', '.join(GIT_MODES)}")
+    repo = GitRepository.discover(project_dir)
+    prefix = os.fsencode(repo.prefix_of(project_dir))
+    try:
+        index_mtime_ns = os.stat(repo.index_path).st_mtime_ns
+        entries = read_index(repo.index_path, repo.hash_size)
+    except FileNotFoundError:
+        entries = []  # a new repository with nothing staged yet
+    base_files = repo.commit_files(repo.resolve(base), os.fsdecode(prefix)) if base else None
+    ignored = PathFilter(matcher).is_ignored
+    previous = None
+    root = os.path.join(project_dir, "")
+    encoding, errors = sys.getfilesystemencoding(), sys.getfilesystemencodeerrors()
+    posix = os.sep == "/"
+
+    for entry in entries:
+        if not entry.path.startswith(prefix) or entry.path == previous:
+            continue  # outside the project, or another stage of a conflicted file
+        previous = entry.path
+        if entry.mode in (MODE_GITLINK, MODE_TREE):
+            continue  # submodules, and folders a sparse index leaves collapsed
+        rel = entry.path[len(prefix):].decode(encoding, errors)
+        if ignored(rel):
+            continue
+        rel_path = rel if posix else rel.replace("/", os.sep)
+        path = root + rel_path
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue  # deleted in the checkout
+        if stat.S_ISDIR(st.st_mode):
+            continue
+        if mode == "changed" and not _changed(repo, entry, path, st, index_mtime_ns, base_files, rel):
+            continue
+        if stat.S_ISLNK(st.st_mode):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # A broken symlink is listed like the walking scanner lists it.
+                yield FileEntry(rel_path, path, 0, 0, 0)
+                continue
+        yield FileEntry(rel_path, path, st.st_size, st.st_mtime_ns, st.st_ino)
+
+def _changed(repo, entry, path, st, index_mtime_ns, base_files, rel):
+    unmerged = entry.stage != 0 or entry.flags & INTENT_TO_ADD
+    clean = not unmerged and _stat_matches(entry, st, index_mtime_ns)
+    if base_files is None:
+        if unmerged:
+            return True
+        if clean:
+            return False
+        if entry.size != st.st_size & 0xFFFFFFFF:
+            return True
+    elif clean:
+        return base_files.get(rel) != entry.oid
+    else:
+        base_oid = base_files.get(rel)
+        if base_oid is None:
+            return True
+        entry = entry._replace(oid=base_oid)
+    try:
+        return blob_id(path, repo.hash_name, stat.S_ISLNK(st.st_mode)) != entry.oid
+    except OSError:
+        return True
+
+def scan_git_project(project_dir, matcher, mode="tracked", base=None):
+    """Like scanner.scan_project, but listing files from the git index."""
+    entries = sorted(iter_git_files(project_dir, matcher, mode, base), key=lambda e: e.rel_path)
+    return ProjectScan(project_dir, entries, sum(e.size for e in entries))
+
+def scan_git_projects(project_dirs, matcher, mode="tracked", base=None):
+    return [scan_git_project(d, matcher, mode, base) for d in project_dirs]
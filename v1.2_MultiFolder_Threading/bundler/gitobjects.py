@@ -0,0 +1,470 @@
+import mmap
+import os
+import re
+import struct
+import zlib
+from collections import OrderedDict
+
+# ==============================================================================
+# GIT REPOSITORY ACCESS (READ-ONLY, NO GIT BINARY)
+# ==============================================================================
+# Just enough of git's on-disk format to find a project's repository, resolve
+# a revision like 'main', 'v1.2', 'HEAD~3' or an abbreviated id to a commit,
+# and list the files of that commit with their blob ids:
+#
+#   loose objects   objects/ab/cdef...   zlib("<type> <size>\0<data>")
+#   packed objects  objects/pack/*.pack  located through the .idx next to it;
+#                                        most are deltas against another object
+#
+# Blob contents are never needed: comparing a working file with a commit only
+# takes the blob id, which is the hash of the file (see gitindex.py).
+
+class GitError(Exception):
+    """Not a git repository, an unreadable or unsupported one, or an unknown revision."""
+
+
+OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+_OFS_DELTA, _REF_DELTA = 6, 7
+
+# Tree entry modes.
+MODE_TREE = 0o040000
+MODE_SYMLINK = 0o120000
+MODE_GITLINK = 0o160000  # a submodule's commit, not a file
+
+# Delta bases kept decompressed, so objects sharing a chain are cheap to read.
+BASE_CACHE_SIZE = 256
+
+_HEX = re.compile(r"[0-9a-fA-F]{4,64}")
+
+
+def _read_text(path):
+    try:
+        with open(path, encoding='utf-8', errors='surrogateescape') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _find_git_dir(path):
+    """(work tree, git dir) of the repository containing path."""
+    start = path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return path, dot_git
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules: a file pointing at the real git dir.
+            text = _read_text(dot_git) or ""
+            if not text.startswith("gitdir:"):
+                raise GitError(f"unrecognised .git file: {dot_git}")
+            return path, os.path.normpath(os.path.join(path, text[len("gitdir:"):].strip()))
+        parent = os.path.dirname(path)
+        if parent == path:
+            raise GitError(f"not inside a git repository: {start}")
+        path = parent
+
+
+class _Pack:
+    """One pack file and its .idx (version 1 or 2)."""
+
+    def __init__(self, idx_path, hash_size):
+        self.pack_path = idx_path[:-len(".idx")] + ".pack"
+        self.hash_size = hash_size
+        with open(idx_path, 'rb') as f:
+            self.idx = f.read()
+        if self.idx[:4] == b"\377tOc":
+            if struct.unpack_from(">I", self.idx, 4)[0] != 2:
+                raise GitError(f"unsupported pack index version: {idx_path}")
+            fanout = 8
+            self.count = struct.unpack_from(">I", self.idx, fanout + 255 * 4)[0]
+            self._names = fanout + 1024
+            self._stride = hash_size
+            self._offsets = self._names + self.count * (hash_size + 4)
+            self._large_offsets = self._offsets + self.count * 4
+        else:
+            fanout = 0
+            self.count = struct.unpack_from(">I", self.idx, 255 * 4)[0]
+            self._names = 1024 + 4
+            self._stride = 4 + hash_size
+            self._offsets = None
+        self.fanout = struct.unpack_from(">256I", self.idx, fanout)
+        self._data = None
+
+    def name(self, i):
+        start = self._names + i * self._stride
+        return self.idx[start:start + self.hash_size]
+
+    def offset(self, i):
+        if self._offsets is None:
+            return struct.unpack_from(">I", self.idx, self._names - 4 + i * self._stride)[0]
+        offset = struct.unpack_from(">I", self.idx, self._offsets + i * 4)[0]
+        if offset & 0x80000000:
+            offset = struct.unpack_from(">Q", self.idx, self._large_offsets + (offset & 0x7FFFFFFF) * 8)[0]
+        return offset
+
+    def _bounds(self, first_byte):
+        return (self.fanout[first_byte - 1] if first_byte else 0), self.fanout[first_byte]
+
+    def _search(self, prefix):
+        """Position of the first name >= prefix within prefix's fanout bucket."""
+        lo, hi = self._bounds(prefix[0])
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.name(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, oid):
+        """Pack offset of oid, or None."""
+        i = self._search(oid)
+        if i < self._bounds(oid[0])[1] and self.name(i) == oid:
+            return self.offset(i)
+        return None
+
+    def matches(self, prefix, hex_prefix):
+        """Object ids starting with hex_prefix (prefix is its whole bytes)."""
+        i = self._search(prefix)
+        found = []
+        end = self._bounds(prefix[0])[1]
+        while i < end and self.name(i).hex().startswith(hex_prefix):
+            found.append(self.name(i))
+            i += 1
+        return found
+
+    def data(self):
+        if self._data is None:
+            with open(self.pack_path, 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._data
+
+
+def _inflate(data, pos, size):
+    decompressor = zlib.decompressobj()
+    out = []
+    step = max(size + 64, 4096)
+    while not decompressor.eof:
+        chunk = data[pos:pos + step]
+        if not chunk:
+            raise GitError("truncated object in pack")
+        out.append(decompressor.decompress(chunk))
+        pos += step
+    result = b"".join(out)
+    if len(result) != size:
+        raise GitError("corrupt object in pack")
+    return result
+
+def _delta_size(delta, pos):
+    size = shift = 0
+    while True:
+        c = delta[pos]
+        pos += 1
+        size |= (c & 0x7F) << shift
+        shift += 7
+        if not c & 0x80:
+            return size, pos
+
+def apply_delta(base, delta):
+    """Rebuild an object from its base and a git delta."""
+    source_size, pos = _delta_size(delta, 0)
+    target_size, pos = _delta_size(delta, pos)
+    if source_size != len(base):
+        raise GitError("delta does not match its base")
+    out = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            # Copy from the base: offset and size bytes are present per bit.
+            offset = size = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            out += base[offset:offset + (size or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise GitError("corrupt delta")
+    if len(out) != target_size:
+        raise GitError("corrupt delta")
+    return bytes(out)
+
+
+class GitRepository:
+    """
+    A repository found from any folder inside its work tree.
+
+    work_tree is the checkout's top folder, git_dir holds its HEAD and index,
+    and common_dir the objects and refs (the same folder except in linked
+    worktrees).
+    """
+
+    def __init__(self, work_tree, git_dir):
+        self.work_tree = work_tree
+        self.git_dir = git_dir
+        common = _read_text(os.path.join(git_dir, "commondir"))
+        self.common_dir = os.path.normpath(os.path.join(git_dir, common.strip())) if common else git_dir
+        if not os.path.isfile(os.path.join(git_dir, "HEAD")):
+            raise GitError(f"not a git directory: {git_dir}")
+        config = _read_text(os.path.join(self.common_dir, "config")) or ""
+        sha256 = re.search(r"^\s*objectformat\s*=\s*sha256\s*$", config, re.MULTILINE | re.IGNORECASE)
+        self.hash_name = "sha256" if sha256 else "sha1"
+        self.hash_size = 32 if sha256 else 20
+        self.index_path = os.path.join(git_dir, "index")
+        self._object_dirs = None
+        self._packs = None
+        self._bases = OrderedDict()
+
+    @classmethod
+    def discover(cls, path):
+        return cls(*_find_git_dir(path))
+
+    def prefix_of(self, path):
+        """path's location in the work tree, '/'-separated with a trailing '/' ('' at the top)."""
+        rel = os.path.relpath(os.path.realpath(path), os.path.realpath(self.work_tree))
+        if rel == os.curdir:
+            return ""
+        return rel.replace(os.sep, "/") + "/"
+
+    # --- Objects ---
+
+    def object_dirs(self):
+        if self._object_dirs is None:
+            objects = os.path.join(self.common_dir, "objects")
+            dirs = [objects]
+            # Alternates: other repositories this one borrows objects from.
+            for line in (_read_text(os.path.join(objects, "info", "alternates")) or "").splitlines():
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    dirs.append(os.path.normpath(os.path.join(objects, line)))
+            self._object_dirs = dirs
+        return self._object_dirs
+
+    def packs(self):
+        if self._packs is None:
+            self._packs = []
+            for objects in self.object_dirs():
+                pack_dir = os.path.join(objects, "pack")
+                try:
+                    names = sorted(os.listdir(pack_dir))
+                except OSError:
+                    continue
+                for name in names:
+                    if name.endswith(".idx") and os.path.exists(os.path.join(pack_dir, name[:-4] + ".pack")):
+                        self._packs.append(_Pack(os.path.join(pack_dir, name), self.hash_size))
+        return self._packs
+
+    def read_object(self, oid):
+        """(type name, data) of the object with the binary id oid."""
+        hex_id = oid.hex()
+        for objects in self.object_dirs():
+            try:
+                with open(os.path.join(objects, hex_id[:2], hex_id[2:]), 'rb') as f:
+                    raw = zlib.decompress(f.read())
+            except OSError:
+                continue
+            except zlib.error:
+                raise GitError(f"corrupt object {hex_id}") from None
+            header, _, data = raw.partition(b"\0")
+            kind, _, _ = header.partition(b" ")
+            return kind.decode('ascii'), data
+        for pack in self.packs():
+            offset = pack.find(oid)
+            if offset is not None:
+                return self._read_packed(pack, offset)
+        raise GitError(f"object {hex_id} not found")
+
+    def _read_packed(self, pack, offset):
+        """Follow a delta chain down to its base, then apply the deltas back up."""
+        deltas = []
+        while True:
+            cached = self._bases.get((pack.pack_path, offset))
+            if cached is not None:
+                self._bases.move_to_end((pack.pack_path, offset))
+                kind, data = cached
+                break
+            data = pack.data()
+            c = data[offset]
+            kind, size, pos, shift = (c >> 4) & 7, c & 0x0F, offset + 1, 4
+            while c & 0x80:
+                c = data[pos]
+                pos += 1
+                size |= (c & 0x7F) << shift
+                shift += 7
+            if kind == _OFS_DELTA:
+                c = data[pos]
+                pos += 1
+                distance = c & 0x7F
+                while c & 0x80:
+                    c = data[pos]
+                    pos += 1
+                    distance = ((distance + 1) << 7) | (c & 0x7F)
+                deltas.append((offset, _inflate(data, pos, size)))
+                offset -= distance
+            elif kind == _REF_DELTA:
+                base_oid = data[pos:pos + pack.hash_size]
+                deltas.append((offset, _inflate(data, pos + pack.hash_size, size)))
+                kind, data = self.read_object(base_oid)
+                break
+            elif kind in OBJECT_TYPES:
+                kind, data = OBJECT_TYPES[kind], _inflate(data, pos, size)
+                if deltas:
+                    self._remember(pack.pack_path, offset, kind, data)
+                break
+            else:
+                raise GitError(f"unknown object type {kind} in {pack.pack_path}")
+        for delta_offset, delta in reversed(deltas):
+            data = apply_delta(data, delta)
+            self._remember(pack.pack_path, delta_offset, kind, data)
+        return kind, data
+
+    def _remember(self, pack_path, offset, kind, data):
+        self._bases[pack_path, offset] = (kind, data)
+        if len(self._bases) > BASE_CACHE_SIZE:
+            self._bases.popitem(last=False)
+
+    def _expand(self, hex_prefix):
+        """The one object id starting with hex_prefix."""
+        hex_prefix = hex_prefix.lower()
+        found = set()
+        if len(hex_prefix) == 2 * self.hash_size:
+            oid = bytes.fromhex(hex_prefix)
+            try:
+                self.read_object(oid)
+                return oid
+            except GitError:
+                return None
+        for objects in self.object_dirs():
+            try:
+                names = os.listdir(os.path.join(objects, hex_prefix[:2]))
+            except OSError:
+                continue
+            found.update(bytes.fromhex(hex_prefix[:2] + n) for n in names if n.startswith(hex_prefix[2:]) and len(n) == 2 * self.hash_size - 2)
+        prefix = bytes.fromhex(hex_prefix[:len(hex_prefix) // 2 * 2])
+        for pack in self.packs():
+            found.update(pack.matches(prefix, hex_prefix))
+        if len(found) > 1:
+            raise GitError(f"abbreviated id {hex_prefix} is ambiguous")
+        return found.pop() if found else None
+
+    # --- Revisions ---
+
+    def _packed_refs(self):
+        refs = {}
+        for line in (_read_text(os.path.join(self.common_dir, "packed-refs")) or "").splitlines():
+            if line and line[0] not in "#^":
+                oid, _, name = line.partition(" ")
+                refs[name.strip()] = oid
+        return refs
+
+    def read_ref(self, name, depth=0):
+        """Binary id a ref (e.g. 'HEAD', 'refs/heads/main') points at, or None."""
+        if depth > 10:
+            raise GitError(f"ref {name} points at itself")
+        value = None
+        for base in (self.git_dir, self.common_dir):
+            value = _read_text(os.path.join(base, *name.split("/")))
+            if value is not None:
+                break
+        if value is None:
+            value = self._packed_refs().get(name)
+        if value is None:
+            return None
+        value = value.strip()
+        if value.startswith("ref:"):
+            return self.read_ref(value[len("ref:"):].strip(), depth + 1)
+        try:
+            return bytes.fromhex(value)
+        except ValueError:
+            raise GitError(f"corrupt ref {name}") from None
+
+    def _peel(self, oid):
+        """The commit oid names, following annotated tags."""
+        while True:
+            kind, data = self.read_object(oid)
+            if kind == "commit":
+                return oid, data
+            if kind != "tag":
+                raise GitError(f"{oid.hex()} is a {kind}, not a commit")
+            oid = bytes.fromhex(data.split(b"\n", 1)[0].split(b" ", 1)[1].decode('ascii'))
+
+    def resolve(self, revision):
+        """
+        Binary id of the commit named by revision: a branch, tag or other ref,
+        a full or abbreviated id, optionally followed by ~N / ^N steps.
+        """
+        match = re.fullmatch(r"(.*?)((?:[~^][0-9]*)*)", revision.strip())
+        name, steps = match.group(1) or "HEAD", match.group(2)
+        if name == "@":
+            name = "HEAD"
+        oid = None
+        if not name.startswith("-") and ".." not in name:
+            for candidate in (name, f"refs/{name}", f"refs/tags/{name}", f"refs/heads/{name}",
+                              f"refs/remotes/{name}", f"refs/remotes/{name}/HEAD"):
+                oid = self.read_ref(candidate)
+                if oid is not None:
+                    break
+        if oid is None and _HEX.fullmatch(name):
+            oid = self._expand(name)
+        if oid is None:
+            raise GitError(f"unknown revision {name!r}")
+        oid, data = self._peel(oid)
+        for step in re.findall(r"[~^][0-9]*", steps):
+            count = int(step[1:]) if len(step) > 1 else 1
+            if step[0] == "~":
+                parents = [1] * count
+            elif count == 0:
+                continue
+            else:
+                parents = [count]
+            for number in parents:
+                found = [l[7:] for l in data.split(b"\n\n", 1)[0].split(b"\n") if l.startswith(b"parent ")]
+                if len(found) < number:
+                    raise GitError(f"{revision!r}: commit {oid.hex()[:12]} has no parent {number}")
+                oid, data = self._peel(bytes.fromhex(found[number - 1].decode('ascii')))
+        return oid
+
+    # --- Trees ---
+
+    def _tree_entries(self, oid):
+        """Yield (mode, name, oid) for each entry of a tree object."""
+        kind, data = self.read_object(oid)
+        if kind != "tree":
+            raise GitError(f"{oid.hex()} is a {kind}, not a tree")
+        pos, n = 0, len(data)
+        while pos < n:
+            space = data.index(b" ", pos)
+            nul = data.index(b"\0", space)
+            end = nul + 1 + self.hash_size
+            yield int(data[pos:space], 8), data[space + 1:nul], data[nul + 1:end]
+            pos = end
+
+    def commit_files(self, commit, prefix=""):
+        """
+        {path: blob oid} for every file of a commit inside folder prefix ('/'-
+        separated with a trailing '/', or ''), with paths relative to prefix.
+        Submodules are left out; symlinks are listed with the blob of their target.
+        """
+        _, data = self.read_object(commit)
+        tree = bytes.fromhex(data.split(b"\n", 1)[0].split(b" ", 1)[1].decode('ascii'))
+        for part in prefix.rstrip("/").split("/") if prefix else ():
+            part = os.fsencode(part)
+            tree = next((oid for mode, name, oid in self._tree_entries(tree) if name == part and mode == MODE_TREE), None)
+            if tree is None:
+                return {}
+        files = {}
+        stack = [(tree, b"")]
+        while stack:
+            tree, base = stack.pop()
+            for mode, name, oid in self._tree_entries(tree):
+                if mode == MODE_TREE:
+                    stack.append((oid, base + name + b"/"))
+                elif mode != MODE_GITLINK:
+                    files[os.fsdecode(base + name)] = oid
+        return files
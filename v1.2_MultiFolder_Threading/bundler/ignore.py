@@ -0,0 +1,232 @@
+import os
+import re
+
+# ==============================================================================
+# IGNORE RULES
+# ==============================================================================
+# Patterns follow .gitignore syntax:
+#
+#   *.log          glob, matches a name at any depth
+#   build/         trailing slash: folders only
+#   /dist  docs/x  a slash anchors the pattern to the folder that defines it
+#   **/tmp  a/**   `**` spans any number of folders
+#   !keep.log      negation: re-include something an earlier rule excluded
+#
+# Rules come from the built-in defaults and from .gitignore / .bundleignore
+# files found while scanning. Each folder's rules are compiled once, when the
+# scanner first enters it, and are shared with every subfolder that adds no
+# rules of its own. Ignored folders are pruned, so nothing below them is
+# ever listed (which also means, as in git, a `!` rule cannot re-include a
+# file inside an excluded folder).
+
+IGNORE_FILE_NAMES = ('.gitignore', '.bundleignore')
+
+_GLOB_CHARS = re.compile(r'[*?\[\\]')
+
+
+def _translate(pattern):
+    """Translate one gitignore glob into a regular expression string."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                at_start = i == 0 or pattern[i - 1] == '/'
+                at_end = i + 2 == n or pattern[i + 2] == '/'
+                if at_start and at_end:
+                    if i + 2 == n:
+                        out.append('.*')          # "a/**": everything inside
+                        i += 2
+                    else:
+                        out.append('(?:.*/)?')    # "**/x", "a/**/x": zero or more folders
+                        i += 3
+                    continue
+            out.append('[^/]*')
+            while i < n and pattern[i] == '*':
+                i += 1
+            continue
+        if c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                body = body.replace('\\', '\\\\').replace('[', '\\[')
+                out.append('[' + body + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class IgnoreRule:
+    """A single compiled ignore pattern, relative to the folder (base) that defines it."""
+    __slots__ = ('pattern', 'negate', 'dir_only', 'anchored', 'literal', 'base', 'regex')
+
+    def __init__(self, pattern, base="", literal=False):
+        self.pattern = pattern
+        self.base = base
+        self.negate = False
+        self.dir_only = False
+        if literal:
+            self.anchored = False
+        else:
+            if pattern.startswith('!'):
+                self.negate = True
+                pattern = pattern[1:]
+            elif pattern.startswith('\\!') or pattern.startswith('\\#'):
+                pattern = pattern[1:]
+            if pattern.endswith('/'):
+                self.dir_only = True
+                pattern = pattern.rstrip('/')
+            self.anchored = '/' in pattern
+            pattern = pattern.lstrip('/')
+            literal = not _GLOB_CHARS.search(pattern)
+        self.literal = pattern if literal and not self.anchored else None
+        self.regex = re.compile(re.escape(pattern) if literal else _translate(pattern), re.DOTALL)
+
+    def matches(self, rel_path, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            if self.base:
+                if not rel_path.startswith(self.base):
+                    return False
+                rel_path = rel_path[len(self.base):]
+            return self.regex.fullmatch(rel_path) is not None
+        if self.literal is not None:
+            return name == self.literal
+        return self.regex.fullmatch(name) is not None
+
+
+def parse_ignore_lines(lines, base=""):
+    """Compile the rules in the lines of a .gitignore-style file."""
+    rules = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('#'):
+            continue
+        # Trailing spaces are ignored unless escaped with a backslash.
+        stripped = line.rstrip(' ')
+        if stripped.endswith('\\') and len(stripped) < len(line):
+            stripped += ' '
+        if stripped and stripped not in ('!', '/'):
+            rules.append(IgnoreRule(stripped, base))
+    return rules
+
+def read_ignore_file(path, base=""):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return parse_ignore_lines(f, base)
+    except OSError:
+        return []
+
+
+class IgnoreMatcher:
+    """
+    The ordered rule list that applies inside one folder. Later rules win.
+
+    Without any `!` rules the check is a set lookup plus one combined regex
+    per kind of rule; with negations the rules are evaluated last to first.
+    """
+
+    def __init__(self, rules=(), ignore_files=IGNORE_FILE_NAMES):
+        self.rules = tuple(rules)
+        self.ignore_files = tuple(ignore_files)
+        self._ordered = any(r.negate for r in self.rules)
+        if not self._ordered:
+            self._names = frozenset(r.literal for r in self.rules if r.literal is not None and not r.dir_only)
+            self._dir_names = frozenset(r.literal for r in self.rules if r.literal is not None and r.dir_only)
+            self._name_re = self._combine(r for r in self.rules if r.literal is None and not r.anchored and not r.dir_only)
+            self._dir_name_re = self._combine(r for r in self.rules if r.literal is None and not r.anchored and r.dir_only)
+            self._anchored = tuple(r for r in self.rules if r.anchored)
+
+    @staticmethod
+    def _combine(rules):
+        patterns = [r.regex.pattern for r in rules]
+        if not patterns:
+            return None
+        return re.compile('|'.join(f'(?:{p})' for p in patterns), re.DOTALL)
+
+    @classmethod
+    def from_patterns(cls, patterns=(), literals=(), ignore_files=IGNORE_FILE_NAMES):
+        """Build the root matcher from glob patterns and exact names (e.g. the output file)."""
+        rules = parse_ignore_lines(patterns)
+        rules.extend(IgnoreRule(name, literal=True) for name in literals)
+        return cls(rules, ignore_files)
+
+    def child(self, dir_path, rel_dir, names):
+        """
+        Return the matcher for a folder being entered.
+
+        names are the entries of that folder; only if it holds an ignore file
+        is anything read and compiled, otherwise the parent matcher is reused.
+        rel_dir is the folder's path relative to the project, '/'-separated,
+        with a trailing '/' (or '' for the project root).
+        """
+        new_rules = []
+        for ignore_file in self.ignore_files:
+            if ignore_file in names:
+                new_rules.extend(read_ignore_file(os.path.join(dir_path, ignore_file), rel_dir))
+        if not new_rules:
+            return self
+        return IgnoreMatcher(self.rules + tuple(new_rules), self.ignore_files)
+
+    def is_ignored(self, rel_path, name, is_dir=False):
+        """rel_path is relative to the project and '/'-separated; name is its last part."""
+        if self._ordered:
+            for rule in reversed(self.rules):
+                if rule.matches(rel_path, name, is_dir):
+                    return not rule.negate
+            return False
+        if name in self._names:
+            return True
+        if is_dir and name in self._dir_names:
+            return True
+        if self._name_re is not None and self._name_re.fullmatch(name):
+            return True
+        if is_dir and self._dir_name_re is not None and self._dir_name_re.fullmatch(name):
+            return True
+        for rule in self._anchored:
+            if rule.matches(rel_path, name, is_dir):
+                return True
+        return False
+
+
+class PathFilter:
+    """
+    Applies an IgnoreMatcher to a flat list of '/'-separated paths that was
+    not produced by walking (e.g. read from the git index): a file is ignored
+    if it or any folder above it is. Folder results are cached.
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self._dirs = {"": False}
+
+    def _dir_ignored(self, rel_dir):
+        ignored = self._dirs.get(rel_dir)
+        if ignored is None:
+            parent, _, name = rel_dir.rpartition("/")
+            ignored = self._dir_ignored(parent) or self.matcher.is_ignored(rel_dir, name, True)
+            self._dirs[rel_dir] = ignored
+        return ignored
+
+    def is_ignored(self, rel_path):
+        parent, _, name = rel_path.rpartition("/")
+        return self._dir_ignored(parent) or self.matcher.is_ignored(rel_path, name)
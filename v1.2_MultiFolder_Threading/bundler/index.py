@@ -0,0 +1,191 @@
+import bisect
+import hashlib
+import json
+import mmap
+import os
+from collections import namedtuple
+
+from .compress import iter_decompressed
+
+# ==============================================================================
+# BUNDLE INDEX
+# ==============================================================================
+# An optional companion file, `<bundle>.index.json`, listing where the body of
+# every `--- File: ... ---` segment sits in the bundle (byte offset and length)
+# and the SHA-256 of those bytes. With it, one file can be pulled out of a
+# multi-GB bundle by mapping the bundle and slicing, instead of scanning it
+# for markers.
+#
+# For compressed bundles, offsets are positions in the uncompressed text and
+# "compression" holds the codec and the frame table, so extraction only
+# decompresses the frames the file lies in.
+#
+# The index also records the size and mtime the bundle had when it was
+# written; if either has changed since, the bundle was rebuilt (or edited)
+# and the offsets no longer apply.
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".index.json"
+
+IndexEntry = namedtuple("IndexEntry", "project path offset length sha256")
+
+
+class BundleIndexError(Exception):
+    """The index is missing, corrupt, stale, or does not match the bundle."""
+
+
+def save_json(path, data):
+    """Write data as compact JSON to path + '.tmp', then rename it over path."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # json.dumps, unlike json.dump, runs the C encoder: several times faster.
+        f.write(json.dumps(data, separators=(",", ":")))
+    os.replace(tmp_path, path)
+
+
+class BundleIndex:
+    """File locations within one bundle."""
+
+    def __init__(self, projects, entries, bundle_size, compression=None, bundle_mtime_ns=None):
+        self.projects = list(projects)
+        self.entries = list(entries)
+        # Size of the bundle file as written (compressed, if it is).
+        self.bundle_size = bundle_size
+        # Its mtime once written; None if it was written to a stream.
+        self.bundle_mtime_ns = bundle_mtime_ns
+        # None, or {"codec": name, "frames": [[uncompressed offset, compressed offset], ...]}.
+        self.compression = compression
+        # 'project/path' -> entries and path -> entries, built on the first find().
+        self._by_name = None
+        self._by_path = None
+
+    @classmethod
+    def from_segments(cls, projects, segments, bundle_size, compression=None):
+        """
+        Build the index from the WrittenSegments a BundleWriter recorded.
+        A deduplicated file points at the contents of its first copy.
+        """
+        entries = []
+        located = {}
+        for seg in segments:
+            first = located.get(seg.same_as) if seg.same_as else None
+            if first is not None:
+                entry = first._replace(project=seg.project, path=seg.path)
+            else:
+                entry = IndexEntry(
+                    seg.project, seg.path, seg.offset + seg.header_length,
+                    seg.length - seg.header_length - seg.footer_length, seg.body_sha256,
+                )
+                located[seg.project, seg.path] = entry
+            entries.append(entry)
+        return cls(projects, entries, bundle_size, compression)
+
+    def save(self, index_path):
+        data = {
+            "version": INDEX_VERSION,
+            "bundle_size": self.bundle_size,
+            "bundle_mtime_ns": self.bundle_mtime_ns,
+            "projects": self.projects,
+            "compression": self.compression,
+            "files": [list(e) for e in self.entries],
+        }
+        save_json(index_path, data)
+
+    @classmethod
+    def load(cls, index_path):
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except OSError as e:
+            raise BundleIndexError(f"cannot read index {index_path}: {e}")
+        except ValueError as e:
+            raise BundleIndexError(f"index {index_path} is corrupt: {e}")
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            raise BundleIndexError(f"index {index_path} has an unsupported format")
+        return cls(
+            data["projects"], (IndexEntry(*e) for e in data["files"]), data["bundle_size"], data.get("compression"),
+            data.get("bundle_mtime_ns"),
+        )
+
+    @classmethod
+    def load_for(cls, bundle_path, index_path=None):
+        """Load the index of bundle_path and check it still describes that file."""
+        index = cls.load(index_path or os.fspath(bundle_path) + INDEX_SUFFIX)
+        st = os.stat(bundle_path)
+        if st.st_size != index.bundle_size:
+            raise BundleIndexError(f"index is stale: bundle is {st.st_size:,} bytes, index expects {index.bundle_size:,}")
+        if index.bundle_mtime_ns is not None and st.st_mtime_ns != index.bundle_mtime_ns:
+            raise BundleIndexError("index is stale: the bundle was modified after the index was written")
+        return index
+
+    def qualified_name(self, entry):
+        return f"{self.projects[entry.project]}/{entry.path}"
+
+    def hashes(self):
+        """{(project number, path): sha256} for reuse when segments are spliced."""
+        return {(e.project, e.path): e.sha256 for e in self.entries}
+
+    def find(self, name):
+        """
+        Look up a file by 'project/path' or, if unambiguous, by its path alone.
+        Raises KeyError if there is no such file or the name is ambiguous.
+        """
+        if self._by_name is None:
+            self._by_name, self._by_path = {}, {}
+            for e in self.entries:
+                self._by_name.setdefault(self.qualified_name(e), []).append(e)
+                self._by_path.setdefault(e.path, []).append(e)
+        name = name.replace(os.sep, '/')
+        matches = self._by_name.get(name) or self._by_path.get(name)
+        if not matches:
+            raise KeyError(f"no file named {name!r} in the bundle")
+        if len(matches) > 1:
+            choices = ", ".join(self.qualified_name(e) for e in matches)
+            raise KeyError(f"{name!r} is ambiguous: {choices}")
+        return matches[0]
+
+
+def _extract_compressed(bundle_path, entry, out, digest, compression):
+    frames = compression["frames"]
+    frame = frames[bisect.bisect_right([u for u, _ in frames], entry.offset) - 1]
+    skip, remaining = entry.offset - frame[0], entry.length
+    with open(bundle_path, 'rb') as f:
+        for data in iter_decompressed(f, compression["codec"], frame[1]):
+            if skip >= len(data):
+                skip -= len(data)
+                continue
+            data = data[skip:skip + remaining]
+            skip = 0
+            if digest is not None:
+                digest.update(data)
+            out.write(data)
+            remaining -= len(data)
+            if not remaining:
+                return
+    raise BundleIndexError(f"bundle ends before {entry.path} does")
+
+def _extract_mapped(bundle_path, entry, out, digest, chunk_size):
+    with open(bundle_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            end = entry.offset + entry.length
+            for start in range(entry.offset, end, chunk_size):
+                with view[start:min(start + chunk_size, end)] as chunk:
+                    if digest is not None:
+                        digest.update(chunk)
+                    out.write(chunk)
+
+def extract(bundle_path, entry, out, verify=False, chunk_size=1024 * 1024, compression=None):
+    """
+    Copy one file's bytes from the bundle to the binary stream out, reading
+    only that slice of the bundle through mmap. For a compressed bundle, pass
+    the index's compression and only the frames holding the file are read.
+    """
+    if entry.length == 0:
+        return
+    digest = hashlib.sha256() if verify else None
+    if compression:
+        _extract_compressed(bundle_path, entry, out, digest, compression)
+    else:
+        _extract_mapped(bundle_path, entry, out, digest, chunk_size)
+    if digest is not None and entry.sha256 and digest.hexdigest() != entry.sha256:
+        raise BundleIndexError(f"checksum mismatch for {entry.path}")
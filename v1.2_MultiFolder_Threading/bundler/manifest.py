@@ -0,0 +1,127 @@
+import json
+import os
+
+from .index import save_json
+
+# ==============================================================================
+# INCREMENTAL BUILD MANIFEST
+# ==============================================================================
+# Stored next to the bundle as `<bundle>.manifest.json`. For every bundled file
+# it remembers the stat data the file had and where its rendered
+# `--- File: ... ---` segment sits in the bundle. On the next run, files whose
+# stat data still matches are spliced straight from the previous bundle instead
+# of being read and decoded again. Files that no longer exist simply are not
+# written to the new manifest.
+#
+# A segment's header holds the file's path relative to its project, so "files"
+# holds one {relative path: record} dict per project, in bundle order: the same
+# file bundled as `alpha/x.py` in one project and `x.py` in another is two
+# segments. A manifest written for other project folders is not used at all.
+
+MANIFEST_VERSION = 3
+MANIFEST_SUFFIX = ".manifest.json"
+
+# A file modified this close to the start of a build may change again within
+# the same mtime tick without its stat data changing, so it is not trusted.
+RACY_WINDOW_NS = 2 * 10**9
+
+# Layout of a record in "files".
+SIZE, MTIME_NS, INODE, OFFSET, LENGTH, DIGEST = range(6)
+
+
+def _bundle_stat(bundle_path):
+    try:
+        st = os.stat(bundle_path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def _projects(project_dirs):
+    return [os.path.abspath(os.fspath(d)) for d in project_dirs]
+
+
+
+class Manifest:
+    """Per-file stat data and segment locations of a previously written bundle."""
+
+    def __init__(self, files=None):
+        self.files = files or []
+
+    @classmethod
+    def load(cls, manifest_path, bundle_path, render_key, project_dirs):
+        """
+        Load the manifest for bundle_path, or return an empty one if it is missing,
+        unreadable, written with different render settings or project folders,
+        or if the bundle it describes has since been changed or removed.
+        """
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        projects = _projects(project_dirs)
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != MANIFEST_VERSION
+            or data.get("render_key") != render_key
+            or data.get("projects") != projects
+            or data.get("bundle") != _bundle_stat(bundle_path)
+            or not isinstance(data.get("files"), list)
+            or len(data["files"]) != len(projects)
+        ):
+            return cls()
+        return cls(data["files"])
+
+    def __bool__(self):
+        return any(self.files)
+
+    def record(self, project, entry):
+        return self.files[project].get(entry.rel_path)
+
+    def unchanged(self, project, entries):
+        """
+        The records of entries whose stat data is unchanged, in order, with
+        None for each entry that must be read again.
+        """
+        files = self.files[project]
+        recs = []
+        for entry in entries:
+            rec = files.get(entry.rel_path)
+            if rec and rec[SIZE] == entry.size and rec[MTIME_NS] == entry.mtime_ns and rec[INODE] == entry.inode:
+                recs.append(rec)
+            else:
+                recs.append(None)
+        return recs
+
+    @classmethod
+    def from_segments(cls, segments, built_ns, project_count, keep_racy=False, runs=()):
+        """
+        Build a manifest from the WrittenSegments of a finished bundle, and
+        the WrittenRuns its spliced files were recorded as, if any.
+        """
+        files = [{} for _ in range(project_count)]
+        racy_ns = float("inf") if keep_racy else built_ns - RACY_WINDOW_NS
+        for entry, project, _, offset, length, _, _, digest, cacheable, _, _ in segments:
+            if cacheable and entry.mtime_ns < racy_ns:
+                files[project][entry.rel_path] = [entry.size, entry.mtime_ns, entry.inode, offset, length, digest]
+        # Spliced files keep their records (they were trusted before, so are
+        # not racy now); only the offsets move. The records are taken over
+        # and updated in place: the manifest they came from describes a
+        # bundle that has just been replaced.
+        for project, run, offset in runs or ():
+            project_files = files[project]
+            for entry, rec in run:
+                rec[OFFSET] = offset
+                project_files[entry.rel_path] = rec
+                offset += rec[LENGTH]
+        return cls(files)
+
+    def save(self, manifest_path, bundle_path, render_key, project_dirs):
+        data = {
+            "version": MANIFEST_VERSION,
+            "render_key": render_key,
+            "projects": _projects(project_dirs),
+            "bundle": _bundle_stat(bundle_path),
+            "files": self.files,
+        }
+        save_json(manifest_path, data)
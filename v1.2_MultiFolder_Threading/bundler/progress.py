@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import namedtuple
+
+# ==============================================================================
+# PROGRESS REPORTING
+# ==============================================================================
+# The engine reports every file to a ProgressReporter, which only keeps the
+# latest state. Listeners either poll snapshot() at their own pace (the GUI
+# redraws at a fixed frame rate) or pass a callback that is invoked at most
+# once per `interval` seconds or `byte_step` bytes, never once per file.
+
+ProgressSnapshot = namedtuple(
+    "ProgressSnapshot",
+    "version text files total_files bytes total_bytes elapsed rate eta running",
+)
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds + 0.5)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def describe(snapshot):
+    """One status line, e.g. 'Bundling: src/app.py  (1,204/9,876 files, 3.1 MB/s, ETA 0:42)'."""
+    if not snapshot.total_files:
+        return snapshot.text
+    return (
+        f"{snapshot.text}  ({snapshot.files:,}/{snapshot.total_files:,} files, "
+        f"{format_bytes(snapshot.rate)}/s, ETA {format_eta(snapshot.eta)})"
+    )
+
+
+class ProgressReporter:
+    """
+    Thread-safe, coalescing progress state for one bundling run.
+
+    callback, if given, receives the same {"type": "progress", ...} and
+    {"type": "max_progress", ...} dicts the GUI queue always used, plus
+    byte counts, throughput (bytes/s) and ETA (seconds), throttled.
+    """
+
+    def __init__(self, callback=None, interval=0.1, byte_step=16 * 1024 * 1024, clock=time.monotonic):
+        self.callback = callback
+        self.interval = interval
+        self.byte_step = byte_step
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._version = 0
+        self._phase = "Starting bundle..."
+        self._prefix = ""
+        self._current = None
+        self._files = self._total_files = 0
+        self._bytes = self._total_bytes = 0
+        self._started = clock()
+        self._finished = None
+        self._last_emit = float("-inf")
+        self._last_emit_bytes = 0
+
+    def set_phase(self, text):
+        """Show a status such as 'Scanning files...' right away."""
+        with self._lock:
+            self._phase, self._prefix, self._current = text, "", None
+            self._version += 1
+        self._emit()
+
+    def start(self, total_files, total_bytes):
+        with self._lock:
+            self._total_files, self._total_bytes = total_files, total_bytes
+            self._files = self._bytes = 0
+            self._started = self.clock()
+            self._phase, self._prefix = "Bundling...", "Bundling: "
+            self._version += 1
+        if self.callback:
+            self.callback({"type": "max_progress", "value": total_files, "bytes": total_bytes})
+        self._emit()
+
+    def advance(self, nbytes, current=None, files=1):
+        """Record finished work; cheap enough to call once per file."""
+        with self._lock:
+            self._files += files
+            self._bytes += nbytes
+            if current is not None:
+                self._current = current
+            self._version += 1
+            if self.callback is None:
+                return
+            now = self.clock()
+            if now - self._last_emit < self.interval and self._bytes - self._last_emit_bytes < self.byte_step:
+                return
+        self._emit()
+
+    def finish(self):
+        with self._lock:
+            self._finished = self.clock()
+            self._version += 1
+        self._emit()
+
+    def snapshot(self):
+        with self._lock:
+            end = self._finished if self._finished is not None else self.clock()
+            elapsed = max(end - self._started, 1e-9)
+            rate = self._bytes / elapsed
+            remaining = self._total_bytes - self._bytes
+            eta = remaining / rate if rate > 0 and remaining > 0 else (0.0 if remaining <= 0 else None)
+            text = self._prefix + self._current if self._current is not None else self._phase
+            return ProgressSnapshot(
+                self._version, text, self._files, self._total_files, self._bytes, self._total_bytes,
+                elapsed, rate, eta, self._finished is None,
+            )
+
+    def _emit(self):
+        if self.callback is None:
+            return
+        snap = self.snapshot()
+        with self._lock:
+            self._last_emit = self.clock()
+            self._last_emit_bytes = snap.bytes
+        self.callback({
+            "type": "progress", "value": snap.files, "text": snap.text,
+            "bytes": snap.bytes, "total_bytes": snap.total_bytes, "rate": snap.rate, "eta": snap.eta,
+        })
+
+
+def as_reporter(progress):
+    """Accept a ProgressReporter, a plain callback, or None."""
+    if isinstance(progress, ProgressReporter):
+        return progress
+    return ProgressReporter(progress)
@@ -0,0 +1,247 @@
+import codecs
+import hashlib
+import mmap
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .sniff import (
+    INCLUDE, SKIP, SNIFF_BYTES, TRUNCATE, binary_placeholder, has_binary_extension,
+    large_placeholder, looks_binary, truncation_marker,
+)
+
+# ==============================================================================
+# READ STAGE
+# ==============================================================================
+# Files are read on a small thread pool that runs ahead of the writer. Results
+# are handed back strictly in input order, and the amount of data in flight is
+# capped by a byte budget (taken from the scanner's stat sizes) rather than by
+# a file count, so a run of large files cannot blow up memory.
+
+# status is one of:
+#   'ok'        content holds the (possibly truncated or placeholder) content
+#   'error'     the file could not be read; content holds the error message
+#   'unchanged' the file matched expected_digest; content is None
+#   'skipped'   a content policy dropped the file; content is None
+#
+# content is a str, except in passthrough mode where valid UTF-8 files come
+# back as their own bytes, or as a RawFile for the writer to copy itself.
+ReadResult = namedtuple("ReadResult", "content digest status")
+
+# An open, already validated file of `length` bytes. Whoever receives it
+# copies it to the output and closes it.
+RawFile = namedtuple("RawFile", "file length")
+
+# Passthrough files at least this large are validated through mmap and handed
+# to the writer as a RawFile instead of being read into memory.
+MMAP_THRESHOLD = 1024 * 1024
+VALIDATE_CHUNK = 1024 * 1024
+
+
+def decode_text(raw):
+    """Decode bytes exactly like open(path, 'r', encoding='utf-8', errors='ignore').read()."""
+    text = raw.decode('utf-8', 'ignore')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+def file_digest(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+def is_utf8(raw):
+    """Return True if raw (bytes) is valid UTF-8; pure ASCII is checked without decoding."""
+    if raw.isascii():
+        return True
+    try:
+        raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def _scan_mapped(mapped, hashing):
+    """Validate (and optionally hash) a memory-mapped file in bounded chunks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    digest = hashlib.sha256() if hashing else None
+    valid = True
+    with memoryview(mapped) as view:
+        for start in range(0, len(view), VALIDATE_CHUNK):
+            chunk = view[start:start + VALIDATE_CHUNK]
+            if digest is not None:
+                digest.update(chunk)
+            if valid:
+                try:
+                    decoder.decode(chunk)
+                except UnicodeDecodeError:
+                    valid = False
+            chunk.release()
+            if not valid and digest is None:
+                break
+    if valid:
+        try:
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            valid = False
+    return valid, digest.hexdigest() if digest is not None else None
+
+def _policy_result(action, placeholder):
+    if action == SKIP:
+        return ReadResult(None, None, 'skipped')
+    return ReadResult(placeholder, None, 'ok')
+
+def _error_result(e):
+    return ReadResult(f"*** ERROR: Could not read file. Reason: {e} ***", None, 'error')
+
+def _read_truncated(content_file, prefix, size, policy):
+    """Keep the first head_bytes and last tail_bytes of a large file, cut at line breaks."""
+    head = prefix[:policy.head_bytes]
+    if len(head) < policy.head_bytes:
+        head += content_file.read(policy.head_bytes - len(head))
+    tail_start = max(size - policy.tail_bytes, len(head))
+    content_file.seek(tail_start)
+    tail = content_file.read(policy.tail_bytes)
+    cut = head.rfind(b'\n')
+    if cut != -1:
+        head = head[:cut + 1]
+    if tail_start > len(head):
+        cut = tail.find(b'\n')
+        if cut != -1:
+            tail = tail[cut + 1:]
+    omitted = max(size - len(head) - len(tail), 0)
+    return decode_text(head).rstrip('\n') + truncation_marker(omitted) + decode_text(tail)
+
+def _precheck(entry, policy):
+    """Apply the parts of a ContentPolicy that need no read at all."""
+    if policy is not None:
+        if policy.binary != INCLUDE and has_binary_extension(entry.path):
+            return _policy_result(policy.binary, binary_placeholder(entry.size))
+        if policy.is_large(entry.size) and policy.large != TRUNCATE:
+            return _policy_result(policy.large, large_placeholder(entry.size))
+    return None
+
+def _sniff(content_file, entry, policy):
+    """Read the prefix and apply the rest of the policy; returns (result or None, prefix)."""
+    prefix = content_file.read(SNIFF_BYTES)
+    if policy.binary != INCLUDE and looks_binary(prefix):
+        return _policy_result(policy.binary, binary_placeholder(entry.size)), prefix
+    if policy.is_large(entry.size):
+        return ReadResult(_read_truncated(content_file, prefix, entry.size, policy), None, 'ok'), prefix
+    return None, prefix
+
+def read_entry(entry, policy=None, hashing=False, expected_digest=None):
+    """
+    Read one file and return a ReadResult.
+
+    With a ContentPolicy, binary and oversized files are recognised from the
+    stat size, the extension or the first SNIFF_BYTES before anything else is
+    read; only text files within the size limit are read in full.
+    """
+    result = _precheck(entry, policy)
+    if result is not None:
+        return result
+    try:
+        with open(entry.path, 'rb') as content_file:
+            if policy is None:
+                raw = content_file.read()
+            else:
+                result, raw = _sniff(content_file, entry, policy)
+                if result is not None:
+                    return result
+                rest = content_file.read()
+                if rest:
+                    raw += rest
+    except Exception as e:
+        return _error_result(e)
+    digest = file_digest(raw) if hashing else None
+    if expected_digest is not None and digest == expected_digest:
+        return ReadResult(None, digest, 'unchanged')
+    return ReadResult(decode_text(raw), digest, 'ok')
+
+def read_entry_raw(entry, policy=None, hashing=False, expected_digest=None):
+    """
+    Passthrough variant of read_entry: a file that is valid UTF-8 is returned
+    as its own bytes (line endings untouched), so it is never decoded and
+    re-encoded. Files of MMAP_THRESHOLD bytes or more are validated through
+    mmap and returned still open as a RawFile. Anything else falls back to
+    the text path.
+    """
+    result = _precheck(entry, policy)
+    if result is not None:
+        return result
+    try:
+        content_file = open(entry.path, 'rb')
+    except Exception as e:
+        return _error_result(e)
+    handed_off = False
+    try:
+        prefix = b''
+        if policy is not None:
+            result, prefix = _sniff(content_file, entry, policy)
+            if result is not None:
+                return result
+
+        if entry.size >= MMAP_THRESHOLD:
+            try:
+                mapped = mmap.mmap(content_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                mapped = None
+            if mapped is not None:
+                with mapped:
+                    valid, digest = _scan_mapped(mapped, hashing)
+                    if expected_digest is not None and digest == expected_digest:
+                        return ReadResult(None, digest, 'unchanged')
+                    if valid:
+                        handed_off = True
+                        return ReadResult(RawFile(content_file, len(mapped)), digest, 'ok')
+                    return ReadResult(decode_text(mapped[:]), digest, 'ok')
+
+        raw = prefix + content_file.read()
+        digest = file_digest(raw) if hashing else None
+        if expected_digest is not None and digest == expected_digest:
+            return ReadResult(None, digest, 'unchanged')
+        if is_utf8(raw):
+            return ReadResult(raw, digest, 'ok')
+        return ReadResult(decode_text(raw), digest, 'ok')
+    except Exception as e:
+        return _error_result(e)
+    finally:
+        if not handed_off:
+            content_file.close()
+
+def read_files(entries, read=read_entry):
+    """Yield (entry, result) pairs one file at a time on the calling thread."""
+    for entry in entries:
+        yield entry, read(entry)
+
+def read_ahead(entries, read=read_entry, workers=8, max_bytes=32 * 1024 * 1024, cost=None):
+    """
+    Yield (entry, result) pairs in input order while up to `workers` threads
+    prefetch the following files, keeping at most ~max_bytes of them in flight.
+
+    cost(entry) estimates the memory a read holds (default: the file size).
+    A single file larger than the budget is still read, just on its own.
+    """
+    if workers <= 1 or max_bytes <= 0:
+        yield from read_files(entries, read)
+        return
+
+    it = iter(entries)
+    pending = deque()  # (entry, future, cost)
+    in_flight = 0
+    next_entry = next(it, None)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bundler-read")
+    try:
+        while pending or next_entry is not None:
+            # Top up the window until the byte budget is used.
+            while next_entry is not None:
+                entry_cost = cost(next_entry) if cost else max(next_entry.size, 1)
+                if pending and in_flight + entry_cost > max_bytes:
+                    break
+                pending.append((next_entry, executor.submit(read, next_entry), entry_cost))
+                in_flight += entry_cost
+                next_entry = next(it, None)
+
+            entry, future, entry_cost = pending.popleft()
+            result = future.result()
+            in_flight -= entry_cost
+            yield entry, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
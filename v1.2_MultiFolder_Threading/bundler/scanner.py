@@ -0,0 +1,92 @@
+import os
+from collections import namedtuple
+
+# ==============================================================================
+# SINGLE-PASS PROJECT SCANNER
+# ==============================================================================
+# Walks each project exactly once with os.scandir(). Relative paths are built
+# by string concatenation as we descend (no os.path.relpath / join round trip),
+# and each file's stat data is captured on the way so later stages never have
+# to touch the directory tree again.
+
+# rel_path uses os.sep, path is the full path ready to open().
+FileEntry = namedtuple("FileEntry", "rel_path path size mtime_ns inode")
+
+ProjectScan = namedtuple("ProjectScan", "project_dir entries total_bytes")
+
+
+def _stat_entry(dir_entry):
+    try:
+        st = dir_entry.stat()
+        return st.st_size, st.st_mtime_ns, st.st_ino
+    except OSError:
+        # Broken symlinks and files that vanished mid-scan are still listed,
+        # the read stage reports the error in the bundle.
+        return 0, 0, 0
+
+def iter_project_files(project_dir, matcher):
+    """
+    Yield a FileEntry for every non-ignored file under project_dir, in directory order.
+
+    matcher is the project's root IgnoreMatcher; ignored folders are pruned
+    before they are entered.
+    """
+    return iter_folder_files(project_dir, "", matcher)
+
+def iter_folder_files(project_dir, rel_dir, matcher, recursive=True, folders=None):
+    """
+    Like iter_project_files, but starting at the folder rel_dir of the project
+    (os.sep-separated with a trailing os.sep, or '' for the project itself).
+
+    matcher is the one in effect for the folder's parent; the folder's own
+    ignore files are applied on entering it. With recursive=False only the
+    files directly in rel_dir are listed. If folders is a list, the rel_dir
+    of every folder entered is appended to it (or, without recursion, of
+    every non-ignored subfolder found).
+    """
+    posix = os.sep == '/'
+    dir_path = os.path.join(project_dir, rel_dir) if rel_dir else project_dir
+    stack = [(dir_path, rel_dir, rel_dir if posix else rel_dir.replace(os.sep, '/'), matcher)]
+    while stack:
+        dir_path, rel_prefix, match_prefix, matcher = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                dir_entries = list(it)
+        except OSError:
+            continue
+        if folders is not None and recursive:
+            folders.append(rel_prefix)
+        # The folder's own ignore files apply to its contents.
+        matcher = matcher.child(dir_path, match_prefix, {e.name for e in dir_entries})
+        subdirs = []
+        for dir_entry in dir_entries:
+            name = dir_entry.name
+            try:
+                is_dir = dir_entry.is_dir()
+            except OSError:
+                is_dir = False
+            if matcher.is_ignored(match_prefix + name, name, is_dir):
+                continue
+            if is_dir:
+                # Like os.walk(followlinks=False): symlinked folders are not entered.
+                if not dir_entry.is_symlink():
+                    sub_prefix = rel_prefix + name + os.sep
+                    if not recursive:
+                        if folders is not None:
+                            folders.append(sub_prefix)
+                        continue
+                    subdirs.append((dir_entry.path, sub_prefix, sub_prefix if posix else match_prefix + name + '/', matcher))
+                continue
+            size, mtime_ns, inode = _stat_entry(dir_entry)
+            yield FileEntry(rel_prefix + name, dir_entry.path, size, mtime_ns, inode)
+        # Reversed so folders are popped in listing order.
+        stack.extend(reversed(subdirs))
+
+def scan_project(project_dir, matcher):
+    """Scan one project and return its files sorted by relative path."""
+    entries = sorted(iter_project_files(project_dir, matcher), key=lambda e: e.rel_path)
+    return ProjectScan(project_dir, entries, sum(e.size for e in entries))
+
+def scan_projects(project_dirs, matcher):
+    """Scan every project once; results are grouped per project, in input order."""
+    return [scan_project(d, matcher) for d in project_dirs]
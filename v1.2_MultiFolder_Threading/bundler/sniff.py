@@ -0,0 +1,123 @@
+import os
+from dataclasses import dataclass
+
+# ==============================================================================
+# CONTENT SNIFFING
+# ==============================================================================
+# Decides, as cheaply as possible, whether a file belongs in a text bundle:
+#
+#   1. size from the scanner's stat data   -> large-file policy, nothing read
+#   2. well-known binary extension         -> binary, nothing read
+#   3. first SNIFF_BYTES of the file       -> magic numbers, NUL bytes and the
+#                                             share of control characters
+#
+# Only files that pass are read in full, so a 500 MB model checkpoint costs a
+# stat() call instead of 500 MB of decoded garbage.
+
+SNIFF_BYTES = 8192
+
+BINARY_EXTENSIONS = frozenset({
+    # images
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.icns', '.tif', '.tiff', '.webp', '.psd', '.heic',
+    # audio / video
+    '.mp3', '.wav', '.flac', '.ogg', '.m4a', '.aac', '.mp4', '.m4v', '.mov', '.avi', '.mkv', '.webm',
+    # archives & packages
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.tar', '.zst', '.lz4', '.jar', '.war', '.whl', '.egg',
+    '.deb', '.rpm', '.dmg', '.iso', '.apk',
+    # compiled code
+    '.exe', '.dll', '.so', '.dylib', '.o', '.obj', '.a', '.lib', '.class', '.pyc', '.pyo', '.pyd', '.wasm', '.bin',
+    # documents
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp',
+    # fonts
+    '.ttf', '.otf', '.woff', '.woff2', '.eot',
+    # data & model weights
+    '.db', '.sqlite', '.sqlite3', '.npy', '.npz', '.pkl', '.pickle', '.pt', '.pth', '.onnx', '.h5', '.hdf5',
+    '.safetensors', '.ckpt', '.parquet', '.feather', '.tflite', '.pb',
+})
+
+MAGIC_NUMBERS = (
+    b'\x89PNG\r\n\x1a\n',     # PNG
+    b'\xff\xd8\xff',          # JPEG
+    b'GIF87a', b'GIF89a',     # GIF
+    b'%PDF-',                 # PDF
+    b'PK\x03\x04', b'PK\x05\x06',  # zip, jar, docx, whl, ...
+    b'\x1f\x8b',              # gzip
+    b'\xfd7zXZ\x00',          # xz
+    b'7z\xbc\xaf\x27\x1c',    # 7-Zip
+    b'Rar!\x1a\x07',          # RAR
+    b'\x28\xb5\x2f\xfd',      # zstd
+    b'\x7fELF',               # ELF
+    b'\xcf\xfa\xed\xfe', b'\xce\xfa\xed\xfe',  # Mach-O
+    b'\xca\xfe\xba\xbe',      # Java class / fat Mach-O
+    b'\x00asm',               # WebAssembly
+    b'SQLite format 3\x00',   # SQLite
+    b'OggS', b'ID3', b'fLaC', # audio
+)
+
+# Bytes expected in text: printable ASCII, common whitespace/control
+# characters, and everything >= 0x80 (UTF-8 multi-byte sequences).
+_TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)))
+
+# Share of unexpected control characters above which a prefix counts as binary.
+CONTROL_CHAR_RATIO = 0.30
+
+# Policies for binary files and for files over ContentPolicy.max_file_bytes.
+# 'skip' leaves the file out of the contents section; it is still listed in
+# the file structure tree.
+INCLUDE, PLACEHOLDER, SKIP, TRUNCATE = 'include', 'placeholder', 'skip', 'truncate'
+BINARY_POLICIES = (PLACEHOLDER, SKIP, INCLUDE)
+LARGE_POLICIES = (TRUNCATE, PLACEHOLDER, SKIP, INCLUDE)
+
+
+def has_binary_extension(path):
+    return os.path.splitext(path)[1].lower() in BINARY_EXTENSIONS
+
+def looks_binary(prefix):
+    """Classify the first bytes of a file as binary (True) or text (False)."""
+    if not prefix:
+        return False
+    if prefix.startswith(MAGIC_NUMBERS):
+        return True
+    if b'\x00' in prefix:
+        return True
+    control = len(prefix.translate(None, _TEXT_BYTES))
+    return control > len(prefix) * CONTROL_CHAR_RATIO
+
+
+@dataclass(frozen=True)
+class ContentPolicy:
+    """What to do with binary files and with files over max_file_bytes."""
+    binary: str = PLACEHOLDER
+    large: str = TRUNCATE
+    # None disables the size limit.
+    max_file_bytes: int = 10 * 1024 * 1024
+    # With large == 'truncate': bytes kept from the start and the end.
+    head_bytes: int = 64 * 1024
+    tail_bytes: int = 16 * 1024
+
+    def is_large(self, size):
+        return self.large != INCLUDE and self.max_file_bytes is not None and size > self.max_file_bytes
+
+    def skips_read(self, entry):
+        """True if entry gets a placeholder (or is skipped) without being opened."""
+        if self.binary != INCLUDE and has_binary_extension(entry.path):
+            return True
+        return self.is_large(entry.size) and self.large != TRUNCATE
+
+    def read_cost(self, entry):
+        """Upper bound of the bytes held in memory while reading entry."""
+        if self.skips_read(entry):
+            return 1
+        if self.is_large(entry.size):
+            return self.head_bytes + self.tail_bytes
+        return max(entry.size, 1)
+
+
+def binary_placeholder(size):
+    return f"*** Binary file not included ({size:,} bytes) ***"
+
+def large_placeholder(size):
+    return f"*** File too large to include ({size:,} bytes) ***"
+
+def truncation_marker(omitted):
+    return f"\n\n*** ... {omitted:,} bytes omitted ... ***\n\n"
@@ -0,0 +1,102 @@
+import bisect
+import os
+
+# ==============================================================================
+# FILE STRUCTURE TREE
+# ==============================================================================
+# build_file_tree() / generate_tree_lines() are the original nested-dict
+# renderer, kept for callers of the public API. Bundles are rendered with
+# iter_tree_lines() below, which gives the same lines for any number of files.
+
+def build_file_tree(file_paths):
+    tree = {}
+    for path in file_paths:
+        parts = path.split(os.sep)
+        current_level = tree
+        for part in parts:
+            if part not in current_level:
+                current_level[part] = {}
+            current_level = current_level[part]
+    return tree
+
+def generate_tree_lines(tree_dict, prefix=""):
+    lines = []
+    items = sorted(tree_dict.keys(), key=lambda k: (not bool(tree_dict[k]), k.lower()))
+    for i, name in enumerate(items):
+        is_last = i == (len(items) - 1)
+        connector = "└── " if is_last else "├── "
+        lines.append(f"{prefix}{connector}{name}")
+        if tree_dict[name]:
+            new_prefix = prefix + ("    " if is_last else "│   ")
+            lines.extend(generate_tree_lines(tree_dict[name], new_prefix))
+    return lines
+
+
+# ------------------------------------------------------------------------------
+# Streaming renderer
+# ------------------------------------------------------------------------------
+# iter_tree_lines() produces the same lines as generate_tree_lines(build_file_tree())
+# without the nested dict or recursion. Each path gets one sort key string that
+# orders paths exactly as the tree is printed (at every level folders first,
+# then case-insensitively by name):
+#
+#   per component: "0" (folder) or "1" (file), name.lower(), NUL, name, NUL
+#
+# In that order a folder's subtree is a contiguous run of keys, so where it
+# ends - and with it whether an entry is the last in its folder, and how many
+# files a folder holds - is a binary search away.
+
+_FOLDER, _FILE, _AFTER = "0", "1", "2"
+
+def _sort_key(path):
+    parts = path.split(os.sep)
+    key = [_FOLDER + part.lower() + "\0" + part + "\0" for part in parts[:-1]]
+    key.append(_FILE + parts[-1].lower() + "\0" + parts[-1] + "\0")
+    return "".join(key)
+
+def _prefix_length(fields, depth):
+    """Length of the key prefix covering components 0..depth, given key.split(NUL)."""
+    return sum(len(f) for f in fields[:2 * depth + 2]) + 2 * depth + 2
+
+def iter_tree_lines(file_paths, collapse_above=None, max_depth=None):
+    """
+    Yield the tree lines for file_paths (os.sep-separated, any order).
+
+    collapse_above: a folder holding more files than this (at any depth)
+    is shown as one line, e.g. 'node_modules/ … 12,345 files'.
+    max_depth: folders at this depth (1 = top level) are shown collapsed
+    rather than opened.
+    """
+    keys = sorted(_sort_key(p) for p in file_paths)
+    ends = []    # for each open folder, the index just past its subtree
+    prefix = ""
+    i = 0
+    while i < len(keys):
+        key = keys[i]
+        fields = key.split("\0")   # lower-case and real name of each component, then ""
+        names = fields[1::2]
+        # Close the folders this path is no longer inside.
+        while ends and i >= ends[-1]:
+            ends.pop()
+            prefix = prefix[:-4]
+        depth = len(ends)
+        parent_end = ends[-1] if ends else len(keys)
+        name = names[depth]
+        if depth < len(names) - 1:
+            # A folder (the path goes deeper than what is open).
+            end = bisect.bisect_left(keys, key[:_prefix_length(fields, depth)] + _AFTER, i, parent_end)
+            is_last = end == parent_end
+            connector = "└── " if is_last else "├── "
+            count = end - i
+            if (collapse_above is not None and count > collapse_above) or (max_depth is not None and depth + 1 >= max_depth):
+                yield f"{prefix}{connector}{name}/ … {count:,} files"
+                i = end
+                continue
+            yield f"{prefix}{connector}{name}"
+            ends.append(end)
+            prefix += "    " if is_last else "│   "
+            continue
+        # A file directly in the innermost open folder.
+        connector = "└── " if i + 1 == parent_end else "├── "
+        yield f"{prefix}{connector}{name}"
+        i += 1
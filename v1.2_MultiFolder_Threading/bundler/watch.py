@@ -0,0 +1,553 @@
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from dataclasses import replace
+
+from .engine import BundleOptions, companion_paths, remove_index, render_project_header, write_incremental, write_index
+from .manifest import Manifest
+from .scanner import FileEntry, ProjectScan, iter_folder_files
+
+# ==============================================================================
+# WATCH MODE
+# ==============================================================================
+# Keeps a bundle up to date while its projects are edited. Files are scanned
+# once; after that the file list lives in memory. An edit only re-stats the
+# files it touched; files added, removed or renamed re-list their folder (new
+# subfolders are walked in full). Each update
+# is an incremental build fed with that list: unchanged files are spliced
+# from the previous bundle, only changed ones are read, and the new bundle is
+# renamed into place (see engine.write_incremental). The project trees are
+# only rendered again when files come or go, and the manifest stays in
+# memory, saved when the watch ends. (If the process is killed, the saved
+# manifest no longer matches the bundle and the next build is a full one.)
+#
+# Changes are detected with inotify (Linux, through ctypes), which costs
+# nothing while idle. Elsewhere, or if inotify runs out of watches, folders
+# are polled instead: every folder's mtime each tick (files added, removed or
+# renamed), plus a rotating share of the files and every recently modified
+# one (edits in place). A burst of changes is debounced into one update.
+
+# An update waits until no change has come in for DEBOUNCE_SECONDS, but
+# starts at most MAX_DELAY_SECONDS after the first change.
+DEBOUNCE_SECONDS = 0.2
+MAX_DELAY_SECONDS = 1.0
+# How often an idle watch checks whether it was asked to stop.
+STOP_CHECK_SECONDS = 0.5
+
+POLL_INTERVAL = 1.0
+POLL_FILES_PER_TICK = 2000
+# The files modified most recently (up to POLL_HOT_FILES, within the last
+# HOT_SECONDS) are stat'ed on every tick, not just in turn.
+POLL_HOT_FILES = 1000
+HOT_SECONDS = 10 * 60
+
+# After each build: how many files changed (None for the first build), how
+# many the bundle holds, and how long the build took.
+WatchUpdate = namedtuple("WatchUpdate", "changed files elapsed")
+
+
+def _parent(rel_dir):
+    """'a/b/' -> 'a/', 'a/' -> '' (os.sep-separated)."""
+    return rel_dir[:rel_dir.rfind(os.sep, 0, len(rel_dir) - 1) + 1]
+
+def _folder_of(rel_path):
+    return rel_path[:rel_path.rfind(os.sep) + 1]
+
+def _note(changes, number, rel_dir, name=None):
+    """
+    Record in changes ({project number: {rel_dir: names}}) that the file name
+    in rel_dir changed, or, without a name, that the folder must be listed
+    again (names None).
+    """
+    folders = changes.setdefault(number, {})
+    if name is None:
+        folders[rel_dir] = None
+    else:
+        names = folders.setdefault(rel_dir, set())
+        if names is not None:
+            names.add(name)
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class WatchedProject:
+    """
+    The file list of one project, kept up to date folder by folder.
+
+    folders maps every non-ignored folder (rel_dir, os.sep-separated with a
+    trailing os.sep, '' for the project itself) to {name: FileEntry} of the
+    files directly in it.
+    """
+
+    def __init__(self, project_dir, matcher):
+        self.project_dir = project_dir
+        self.matcher = matcher
+        self.folders = {}
+        self._matchers = {}  # rel_dir -> matcher inside that folder
+        self._header = None  # rendered banner and tree, until files come or go
+        self.rescan()
+
+    def rescan(self):
+        """Scan the whole project again; returns how many files were added, removed or changed."""
+        before = set(self.entries())
+        self.folders = {}
+        self._matchers = {}
+        self._header = None
+        self._walk("")
+        return len(before.symmetric_difference(self.entries()))
+
+    def entries(self):
+        return (entry for files in self.folders.values() for entry in files.values())
+
+    def scan(self):
+        """The current file list as a ProjectScan, sorted like scanner.scan_project's."""
+        entries = sorted(self.entries(), key=lambda e: e.rel_path)
+        return ProjectScan(self.project_dir, entries, sum(e.size for e in entries))
+
+    def header(self, scan, options):
+        """
+        The pieces engine.render_project_header() yields for scan. Edits leave
+        the tree as it was, so it is only rendered again once files were
+        added, removed or renamed.
+        """
+        if self._header is None:
+            self._header = list(render_project_header(
+                os.path.basename(self.project_dir), (e.rel_path for e in scan.entries),
+                options.tree_collapse_above, options.tree_max_depth,
+            ))
+        return self._header
+
+    def _matcher_in(self, rel_dir):
+        """The matcher that applies inside rel_dir, its own ignore files included."""
+        matcher = self._matchers.get(rel_dir)
+        if matcher is None:
+            parent = self._parent_matcher(rel_dir)
+            path = os.path.join(self.project_dir, rel_dir)
+            names = {n for n in parent.ignore_files if os.path.isfile(os.path.join(path, n))}
+            matcher = parent.child(path, rel_dir.replace(os.sep, '/'), names)
+            self._matchers[rel_dir] = matcher
+        return matcher
+
+    def _parent_matcher(self, rel_dir):
+        return self._matcher_in(_parent(rel_dir)) if rel_dir else self.matcher
+
+    def _walk(self, rel_dir):
+        """List rel_dir and everything below it; returns the number of files found."""
+        self._header = None
+        found = []
+        entries = list(iter_folder_files(self.project_dir, rel_dir, self._parent_matcher(rel_dir), folders=found))
+        for folder in found:
+            self.folders[folder] = {}
+        for entry in entries:
+            self.folders[_folder_of(entry.rel_path)][os.path.basename(entry.rel_path)] = entry
+        return len(entries)
+
+    def _drop(self, rel_dir):
+        """Forget rel_dir and everything below it; returns the number of files forgotten."""
+        self._header = None
+        gone = [d for d in self.folders if d.startswith(rel_dir)]
+        for cached in [d for d in self._matchers if d.startswith(rel_dir)]:
+            del self._matchers[cached]
+        return sum(len(self.folders.pop(d)) for d in gone)
+
+    def refresh(self, changes):
+        """
+        Bring the folders in changes ({rel_dir: names}) up to date: re-stat
+        the files names, or list the folder again where names is None.
+        Returns how many files were added, removed or changed.
+        """
+        changed = 0
+        for rel_dir in sorted(changes, key=len):  # parents first
+            before = self.folders.get(rel_dir)
+            if before is None:
+                continue  # not watched (ignored), or already dropped with its parent
+            names = changes[rel_dir]
+            if names is not None and names.isdisjoint(self.matcher.ignore_files):
+                changed += self._restat(rel_dir, names)
+                continue
+            if not os.path.isdir(os.path.join(self.project_dir, rel_dir)):
+                changed += self._drop(rel_dir)
+                continue
+            subfolders = []
+            listed = {
+                os.path.basename(e.rel_path): e
+                for e in iter_folder_files(self.project_dir, rel_dir, self._parent_matcher(rel_dir), recursive=False, folders=subfolders)
+            }
+            names = {n for n in listed.keys() | before.keys() if listed.get(n) != before.get(n)}
+            if names & set(self.matcher.ignore_files):
+                # Its ignore rules changed: everything below may be in or out now.
+                subtree = lambda: {e for d, files in self.folders.items() if d.startswith(rel_dir) for e in files.values()}
+                before = subtree()
+                self._drop(rel_dir)
+                self._walk(rel_dir)
+                changed += len(before.symmetric_difference(subtree()))
+                continue
+            self.folders[rel_dir] = listed
+            if listed.keys() != before.keys():
+                self._header = None
+            changed += len(names)
+            known = {d for d in self.folders if d != rel_dir and _parent(d) == rel_dir}
+            for gone in known.difference(subfolders):
+                changed += self._drop(gone)
+            for new in set(subfolders).difference(known):
+                changed += self._walk(new)
+        return changed
+
+    def _restat(self, rel_dir, names):
+        """Take new stat data for the files names in rel_dir; returns how many changed."""
+        files = self.folders[rel_dir]
+        changed = 0
+        for name in names:
+            entry = files.get(name)
+            if entry is None:
+                continue  # ignored, or a folder; new files come as listing changes
+            try:
+                st = os.stat(entry.path)
+                stat = (st.st_size, st.st_mtime_ns, st.st_ino)
+            except OSError:
+                stat = (0, 0, 0)  # as scanner._stat_entry records it
+            if stat != (entry.size, entry.mtime_ns, entry.inode):
+                files[name] = FileEntry(entry.rel_path, entry.path, *stat)
+                changed += 1
+        return changed
+
+
+# --- Change detection ---
+
+_IN_NONBLOCK, _IN_CLOEXEC = 0o4000, 0o2000000
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+)
+_EVENT = struct.Struct("iIII")
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+def _merge(changes, more):
+    """Combine two wait() results; None (rescan everything) wins."""
+    if changes is None or more is None:
+        return None
+    for number, folders in more.items():
+        for rel_dir, names in folders.items():
+            if names is None:
+                _note(changes, number, rel_dir)
+            else:
+                for name in names:
+                    _note(changes, number, rel_dir, name)
+    return changes
+
+
+class InotifyWatcher:
+    """
+    Reports which files and folders of the watched projects changed, through Linux
+    inotify: one watch per folder, nothing to do between events.
+
+    wait() returns {project number: {rel_dir: names}}, where names is the
+    set of files in rel_dir that were modified, or None if files were added,
+    removed or renamed and the folder must be listed again. It is empty after
+    a timeout, and None if events were lost and everything must be rescanned.
+    """
+
+    def __init__(self, projects, ignore_name=lambda name: False):
+        self.libc = _load_libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.projects = projects
+        self.ignore_name = ignore_name
+        self.fd = self.libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}  # watch descriptor -> (project number, rel_dir)
+        self._wds = {}      # (project number, rel_dir) -> watch descriptor
+        try:
+            self.sync()
+        except OSError:
+            self.close()
+            raise
+
+    def sync(self):
+        """
+        Watch every folder the projects now have, and stop watching gone
+        ones. Returns the folders newly watched: changes made in them before
+        their watch existed were missed, so they must be listed again.
+        """
+        current = {(number, rel_dir) for number, project in enumerate(self.projects) for rel_dir in project.folders}
+        for key in [k for k in self._wds if k not in current]:
+            wd = self._wds.pop(key)
+            self._watches.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+        added = {}
+        initial = not self._wds
+        for number, rel_dir in current.difference(self._wds):
+            path = os.path.join(self.projects[number].project_dir, rel_dir)
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # already gone; its parent's events report that
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch limit reached (see fs.inotify.max_user_watches)")
+                raise OSError(err, os.strerror(err), path)
+            self._watches[wd] = (number, rel_dir)
+            self._wds[number, rel_dir] = wd
+            if not initial:
+                _note(added, number, rel_dir)
+        return added
+
+    def wait(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return {}
+        changes = {}
+        lost = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+                name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+                pos += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    lost = True
+                    continue
+                where = self._watches.get(wd)
+                if where is None:
+                    continue
+                number, rel_dir = where
+                if mask & IN_IGNORED:
+                    # The folder is gone (or unmounted); its watch went with it.
+                    del self._watches[wd]
+                    self._wds.pop(where, None)
+                    _note(changes, number, _parent(rel_dir))
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    _note(changes, number, _parent(rel_dir))
+                elif not name:
+                    _note(changes, number, rel_dir)
+                else:
+                    name = os.fsdecode(name)
+                    if self.ignore_name(name):
+                        continue
+                    if mask & (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE) and not mask & IN_ISDIR:
+                        _note(changes, number, rel_dir, name)
+                    else:
+                        _note(changes, number, rel_dir)
+        return None if lost else changes
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """
+    The fallback: finds changed files and folders by polling stat data every `interval`
+    seconds. Same interface as InotifyWatcher.
+
+    Added, removed and renamed files show in their folder's mtime, which is
+    checked for every folder on every tick. Edits in place only show in the
+    file's own stat data: the most recently modified files are checked every
+    tick, all files files_per_tick at a time, in turn.
+    """
+
+    def __init__(self, projects, interval=POLL_INTERVAL, files_per_tick=POLL_FILES_PER_TICK):
+        self.projects = projects
+        self.interval = interval
+        self.files_per_tick = files_per_tick
+        self._mtimes = {}  # (project number, rel_dir) -> mtime_ns seen
+        self._files = []
+        self._hot = []
+        self._cursor = 0
+        self._next_tick = time.monotonic() + interval
+        self.sync()
+        # The first sync's folder times are the baseline, not "unknown".
+        for key in self._mtimes:
+            self._mtimes[key] = self._mtime(key)
+
+    def _mtime(self, key):
+        number, rel_dir = key
+        try:
+            return os.stat(os.path.join(self.projects[number].project_dir, rel_dir)).st_mtime_ns
+        except OSError:
+            return None
+
+    def sync(self):
+        current = {(number, rel_dir) for number, project in enumerate(self.projects) for rel_dir in project.folders}
+        # New folders start unknown, so the next tick lists them once more
+        # (they may have changed since they were walked).
+        self._mtimes = {key: self._mtimes.get(key, -1) for key in current}
+        self._files = [(number, entry) for number, project in enumerate(self.projects) for entry in project.entries()]
+        cutoff = time.time_ns() - HOT_SECONDS * 10**9
+        recent = (f for f in self._files if f[1].mtime_ns >= cutoff)
+        self._hot = heapq.nlargest(POLL_HOT_FILES, recent, key=lambda f: f[1].mtime_ns)
+        self._cursor %= max(len(self._files), 1)
+        return {}
+
+    def wait(self, timeout):
+        delay = self._next_tick - time.monotonic()
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            return {}
+        if delay > 0:
+            time.sleep(delay)
+        self._next_tick = time.monotonic() + self.interval
+        return self._poll()
+
+    def _poll(self):
+        changes = {}
+        for key, seen in self._mtimes.items():
+            mtime = self._mtime(key)
+            if mtime != seen:
+                self._mtimes[key] = mtime
+                _note(changes, *key)
+        batch = self._files[self._cursor:self._cursor + self.files_per_tick]
+        self._cursor = (self._cursor + len(batch)) % max(len(self._files), 1)
+        for number, entry in batch + self._hot:
+            try:
+                st = os.stat(entry.path)
+                now = (st.st_size, st.st_mtime_ns, st.st_ino)
+            except OSError:
+                now = (0, 0, 0)  # as the scanner records unreadable entries
+            if now != (entry.size, entry.mtime_ns, entry.inode):
+                folder = _folder_of(entry.rel_path)
+                _note(changes, number, folder, entry.rel_path[len(folder):])
+        return changes
+
+    def close(self):
+        pass
+
+
+# --- Watch loop ---
+
+def watch(project_dirs, output_path, options=None, on_update=None, stop=None, progress=None,
+          poll=False, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE_SECONDS):
+    """
+    Build output_path incrementally, then update it after every change to
+    the projects until stop (a threading.Event) is set.
+
+    on_update(WatchUpdate) is called after each build. poll forces the
+    stat-polling watcher even where inotify is available.
+    """
+    options = options or BundleOptions()
+    if options.compression or options.chunk_size or options.dedupe or options.git_files:
+        raise ValueError("watch mode cannot be combined with compression, chunks, dedupe or git file lists")
+    output_path = os.fspath(output_path)
+    project_dirs = [os.fspath(d) for d in project_dirs]
+    manifest_path, index_path = companion_paths(output_path, options)
+    own_files = {os.path.basename(p) for p in (output_path, manifest_path, index_path)}
+    options = replace(options, incremental=True, exclude=set(options.exclude) | own_files)
+    own_files |= {name + ".tmp" for name in own_files}
+    tmp_prefix = "." + os.path.basename(output_path) + "."
+
+    def ignore_name(name):
+        """Events for the bundle's own files must not trigger another update."""
+        return name in own_files or (name.startswith(tmp_prefix) and name.endswith(".tmp"))
+
+    matcher = options.ignore_matcher()
+    projects = [WatchedProject(d, matcher) for d in project_dirs]
+    watcher = None
+    if not poll:
+        try:
+            watcher = InotifyWatcher(projects, ignore_name)
+        except OSError:
+            watcher = None
+    if watcher is None:
+        watcher = PollingWatcher(projects, poll_interval)
+    stop = stop or threading.Event()
+    render_key = options.render_key()
+    manifest = Manifest.load(manifest_path, output_path, render_key, project_dirs)
+    written = _stat_key(output_path) if manifest else None
+
+    def build(changed):
+        nonlocal manifest, written
+        started = time.monotonic()
+        if written != _stat_key(output_path):
+            manifest = Manifest()  # the bundle was changed or removed behind our back
+        scans = [p.scan() for p in projects]
+        headers = [p.header(s, options) for p, s in zip(projects, scans)]
+        writer, manifest = write_incremental(project_dirs, output_path, options, manifest, progress, scans, headers)
+        written = _stat_key(output_path)
+        if options.index:
+            write_index(project_dirs, writer, index_path, bundle_path=output_path)
+        else:
+            remove_index(index_path)
+        if on_update:
+            on_update(WatchUpdate(changed, sum(len(s.entries) for s in scans), time.monotonic() - started))
+
+    try:
+        build(None)
+        while not stop.is_set():
+            changes = watcher.wait(STOP_CHECK_SECONDS)
+            if changes == {}:
+                continue
+            first = time.monotonic()
+            while changes is not None:
+                remaining = first + MAX_DELAY_SECONDS - time.monotonic()
+                if remaining <= 0:
+                    break
+                more = watcher.wait(min(debounce, remaining))
+                if more == {}:
+                    break
+                changes = _merge(changes, more)
+
+            if changes is None:
+                changed = sum(p.rescan() for p in projects)
+            else:
+                changed = sum(projects[n].refresh(folders) for n, folders in changes.items())
+            try:
+                new_folders = watcher.sync()
+                while new_folders:
+                    changed += sum(projects[n].refresh(folders) for n, folders in new_folders.items())
+                    new_folders = watcher.sync()
+            except OSError:
+                # Out of inotify watches: fall back to polling from here on.
+                watcher.close()
+                watcher = PollingWatcher(projects, poll_interval)
+            if changed:
+                build(changed)
+    finally:
+        watcher.close()
+        if written is not None and written == _stat_key(output_path):
+            manifest.save(manifest_path, output_path, render_key, project_dirs)